@@ -1,5 +1,4 @@
 from abc import ABC, abstractmethod
-import os
 
 class File(ABC):
     def __init__(self, name, date_created, date_modified, size, type) -> None:
@@ -20,6 +19,12 @@ class File(ABC):
     @abstractmethod
     def get_date_modified(self):
         return self.__date_modified
+
+    def set_name(self, name):
+        self.__name = name
+
+    def set_date_modified(self, date):
+        self.__date_modified = date
     
     @abstractmethod
     def get_size(self):
@@ -40,19 +45,20 @@ class File(ABC):
 class Note(File):
     def __init__(self, name, date_created, date_modified, size, memo) -> None:
         super().__init__(name, date_created, date_modified, size, "txt")
-        self.__memo = memo if memo else []
+        # Child notes are kept by name so lookup, rename and delete do not scan
+        self.__memo = {note.get_name(): note for note in memo} if memo else {}
 
     def get_name(self):
         return super().get_name()
     
     def set_name(self, name):
-        self.__name = name
+        super().set_name(name)
     
     def get_date_created(self):
         return super().get_date_created()
     
     def set_date_modified(self, date):
-        self.__date_modified = date
+        super().set_date_modified(date)
     
     def get_date_modified(self):
         return super().get_date_modified()
@@ -64,30 +70,72 @@ class Note(File):
         return super().get_type()
     
     def get_memo(self):
-        return self.__memo
+        return list(self.__memo.values())
     
     def set_memo(self, memo):
-        self.__memo = memo
+        self.__memo = {note.get_name(): note for note in memo}
+
+    def find_note(self, name):
+        return self.__memo.get(name)
 
     def add_note(self, note):
-        self.get_memo().append(note)
-        # for note in self.get_memo():
-        #     print(f"Name: {note.get_name()}, Date Created: {note.get_date_created()}")
+        self.__memo[note.get_name()] = note
 
     def delete_note(self, name):
-        #self.get_memo()[:] = [note for note in self.get_memo() if note.get_name() != name]
-        self.get_memo().pop(-1)
+        return self.__memo.pop(name, None)
+
+    def rename_note(self, old_name, new_name, storage=None):
+        note = self.__memo.pop(old_name, None)
+        if note is not None:
+            note.update_name(new_name, storage)
+            self.__memo[new_name] = note
+        return note
         
-    def update_name(self, new_name):
+    def update_name(self, new_name, storage=None):
         old_name = self.get_name()
-        
-        # Check if the note is in the application's notes list and update its name
-        note_in_memo = next((note for note in self.get_memo() if self.get_name() == old_name), None)
-        if note_in_memo:
-            note_in_memo.set_name(new_name)
+        # Callers that already moved the stored note pass no storage
+        if storage is not None and storage.exists(old_name):
+            storage.rename(old_name, new_name)
+        self.set_name(new_name)
+
+class NoteRecord:
+    # Metadata of one stored note, slots keep it small enough for a million of them
+    __slots__ = ("name", "mtime", "size")
+
+    def __init__(self, name, mtime, size):
+        self.name = name
+        self.mtime = mtime
+        self.size = size
+
+class NoteCatalog:
+    # Name -> NoteRecord hash index over every stored note
+    def __init__(self):
+        self.records = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, name):
+        return self.records.get(name)
+
+    def matches(self, name, mtime, size):
+        record = self.records.get(name)
+        return record is not None and record.mtime == mtime and record.size == size
+
+    def update(self, name, mtime, size):
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = NoteRecord(name, mtime, size)
         else:
-            file_path_old = os.path.join(os.path.expanduser("~/Documents"), f"{old_name}.txt")
-            file_path_new = os.path.join(os.path.expanduser("~/Documents"), f"{new_name}.txt")
-            os.rename(file_path_old, file_path_new)
+            record.mtime = mtime
+            record.size = size
+        return record
 
-        self.set_name(new_name)
\ No newline at end of file
+    def remove(self, name):
+        return self.records.pop(name, None)
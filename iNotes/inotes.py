@@ -2,6 +2,12 @@ import os
 import tkinter as tk
 from datetime import datetime
 from iNotes_classes import Note
+from inotes_core import NoteStore
+from inotes_metrics import metrics
+from inotes_query import QueryError
+from inotes_storage import FolderStorage, open_storage
+from inotes_workers import BackgroundWorker
+from inotes_editor import EditorFinder, LazyTextLoader, PagedTextLoader
 from tkinter import messagebox
 
 class WindowBuilder:
@@ -43,28 +49,34 @@ class WindowFacade:
         return self.frames.get(frame_name)
 
     def create_frame(self, parent, bg, width, height, relief):
+        metrics.count("widgets_created")
         frame = tk.Frame(parent, width=width, height=height, relief=relief)    
         frame.config(bg=bg)
         return frame
 
     def create_label(self, parent, text, font, bg, fg):
+        metrics.count("widgets_created")
         label = tk.Label(parent, text=text, font=font, bg=bg, fg=fg)
         return label
 
     def create_button(self, parent, text, width, relief, bg, fg, command):
+        metrics.count("widgets_created")
         button = tk.Button(parent, text=text, width=width, relief=relief, bg=bg, fg=fg, command=command)
         return button
 
     def create_entry(self, parent, placeholder, show, width):
+        metrics.count("widgets_created")
         entry = tk.Entry(parent, show=show, width=width)
         entry.insert(0, placeholder)
         return entry
 
     def create_radio_button(self, parent, text, variable, value, bg):
+        metrics.count("widgets_created")
         radio = tk.Radiobutton(parent, text=text, variable=variable, value=value, bg=bg)
         return radio
     
     def create_top_level_window(self, title, size, bg_color):
+        metrics.count("widgets_created")
         top_level_window = tk.Toplevel(self.builder.master)
         top_level_window.title(title)
         top_level_window.geometry(size)
@@ -73,35 +85,176 @@ class WindowFacade:
         return top_level_window
     
     def create_text_editor(self, parent, content, width, height):
+        metrics.count("widgets_created")
         text_area = tk.Text(parent, width=width, height=height)
         text_area.insert(tk.END, content)
         return text_area
 
+    def create_scrollbar(self, parent, command):
+        metrics.count("widgets_created")
+        scrollbar = tk.Scrollbar(parent, orient=tk.VERTICAL, command=command)
+        return scrollbar
+
+    def create_list_box(self, parent, width, height):
+        metrics.count("widgets_created")
+        list_box = tk.Listbox(parent, width=width, height=height)
+        return list_box
+
+class NoteListView:
+    # Only the rows in view (plus a small overscan) get widgets, they are recycled while scrolling
+    ROW_HEIGHT = 30
+    OVERSCAN = 2
+
+    def __init__(self, facade, parent, listing, on_open, width, height):
+        self.facade = facade
+        self.listing = listing
+        self.on_open = on_open
+        self.height = height
+        self.descending = True
+        self.offset = 0
+        self.slot_names = []
+        self.slots = []
+
+        self.frame = facade.create_frame(parent, "#0a014f", width, height, relief=tk.FLAT)
+        self.scrollbar = facade.create_scrollbar(parent, self.yview)
+        self.frame.bind("<Configure>", lambda event: self.render())
+        self.bind_wheel(self.frame)
+
+        pool_size = height // self.ROW_HEIGHT + 1 + self.OVERSCAN
+        for slot_no in range(pool_size):
+            note_button = facade.create_button(self.frame, "", 26, "flat", "#060c44", "white", command=lambda slot_no=slot_no: self.open_slot(slot_no))
+            date_modified_label = facade.create_label(self.frame, "", ("Arial", 10), "#0a014f", "white")
+            file_size_label = facade.create_label(self.frame, "", ("Arial", 10), "#0a014f", "white")
+            for widget in (note_button, date_modified_label, file_size_label):
+                self.bind_wheel(widget)
+            self.slots.append((note_button, date_modified_label, file_size_label))
+            self.slot_names.append(None)
+
+    def place(self, x, y, scrollbar_x):
+        self.frame.place(x=x, y=y)
+        self.scrollbar.place(x=scrollbar_x, y=y, height=self.height)
+
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.yview("scroll", -1 if event.delta > 0 else 1, "units"))
+        widget.bind("<Button-4>", lambda event: self.yview("scroll", -1, "units"))
+        widget.bind("<Button-5>", lambda event: self.yview("scroll", 1, "units"))
+
+    def show(self, descending):
+        if descending != self.descending:
+            self.descending = descending
+            self.offset = 0
+        self.render()
+
+    def total_height(self):
+        return len(self.listing) * self.ROW_HEIGHT
+
+    def yview(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * self.total_height())
+        elif unit == "pages":
+            self.offset += int(amount) * self.height
+        else:
+            self.offset += int(amount) * self.ROW_HEIGHT
+        self.render()
+
+    def render(self):
+        total = self.total_height()
+        self.offset = max(0, min(self.offset, total - self.height))
+        first_row = self.offset // self.ROW_HEIGHT
+
+        for slot_no, (note_button, date_modified_label, file_size_label) in enumerate(self.slots):
+            row = first_row + slot_no
+            if row >= len(self.listing):
+                self.slot_names[slot_no] = None
+                note_button.place_forget()
+                date_modified_label.place_forget()
+                file_size_label.place_forget()
+                continue
+
+            file_name, file_mtime, file_size = self.listing.row(row, self.descending)
+            self.slot_names[slot_no] = file_name
+            file_date = datetime.fromtimestamp(file_mtime).strftime("%m/%d/%Y %I:%M %p")
+            file_size_kb = file_size / 1024.0
+            file_size_str = f"{file_size_kb:.2f} KB"
+            y = row * self.ROW_HEIGHT - self.offset + 2
+            note_button.config(text=file_name)
+            note_button.place(x=15, y=y)
+            date_modified_label.config(text=file_date)
+            date_modified_label.place(x=250, y=y)
+            file_size_label.config(text=file_size_str)
+            file_size_label.place(x=490, y=y)
+
+        if total > self.height:
+            self.scrollbar.set(self.offset / total, (self.offset + self.height) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def open_slot(self, slot_no):
+        if self.slot_names[slot_no] is not None:
+            self.on_open(self.slot_names[slot_no])
+
 class INotesApplication(tk.Tk):
-    def __init__(self) -> None:
+    def __init__(self, storage=None) -> None:
         super().__init__()
         self.facade = WindowFacade(self, "iNotes", 800, 600, (False, False))
         self.window = self.facade.build_window()
         self.notes = Note("My Notes", datetime.now(), datetime.now(), 0, [])
-        self.text_files = []
-        self.file_names = []
-        self.file_dates = []
-        self.file_sizes = []
         self.text_area = None
+        self.text_loader = None
+        self.finder = None
+        self.current_note = None
+        # Milliseconds of idle time after the last keystroke before the note is saved, None turns it off
+        self.autosave_delay = 2000
+        self.autosave_id = None
+        # Notes larger than this open in a read-only paged view
+        self.paged_view_threshold = 8 * 1024 * 1024
         self.current_sort_method = None
         self.main_menu_frame = None
+        self.menu_view = None
+        self.editor_view = None
+        # Set use_processes=True to spread fuzzy matching over a process pool on large vocabularies
+        self.worker = BackgroundWorker(self, use_processes=False)
+        # All note logic lives in the headless core, every read and write goes through its storage backend
+        storage = storage if storage is not None else FolderStorage(os.path.expanduser("~/Documents"))
+        self.store = NoteStore(storage, self.worker.process_pool())
+        self.search_max_distance = 1
+        self.search_result_limit = 10
+        # The index is only needed for search, it is loaded this long after the window is up
+        self.index_delay = 2000
+        self.listing_loaded = False
+        # Changes made by other programs are picked up by a watcher and applied every this many
+        # milliseconds, None turns the watcher off and every redraw rescans instead
+        self.watch_interval = 300
         self.main_menu_frame = self.facade.create_frame(self.master, "#0a014f", 800, 600, relief=tk.RAISED)
         self.main_menu_frame.pack(fill=tk.BOTH, expand=True)
-        self.display_main_menu(sort_key=lambda x: x[1], is_reversed=False)
-        
-    def display_main_menu(self, sort_key=lambda x: x[1], is_reversed=False):
-        self.clear_widgets(self.main_menu_frame)
-        self.current_sort_method = sort_key.__name__.replace('_', ' ')
-        self.file_names.clear()
-        self.file_dates.clear()
-        self.file_sizes.clear()
-
-        self.navigation_frame = self.facade.create_frame(self.main_menu_frame, "#060c44", 800, 95, relief=tk.RAISED)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        # The first page is painted from the last run's snapshot, the first scan brings in the rest
+        self.store.load_snapshot("date", descending=True)
+        self.display_main_menu(sort_key="date", is_reversed=False)
+        self.after(self.index_delay, self.load_index)
+
+    def load_index(self):
+        self.show_status("Indexing notes...")
+        self.worker.submit("index", lambda token, emit, progress: self.store.ensure_index(token, progress), on_progress=lambda done, total: self.show_status(f"Indexing notes... {done}/{total}"), on_done=lambda result: self.show_status(""))
+
+    def show_status(self, text):
+        if self.menu_view is not None:
+            self.status_label.config(text=text)
+
+    def close(self):
+        self.flush_autosave()
+        if self.listing_loaded:
+            self.store.save_snapshot("date", descending=True)
+        self.store.close()
+        self.worker.shutdown()
+        self.destroy()
+
+    @metrics.timed("build_main_menu")
+    def build_main_menu(self):
+        # Built once, later redraws only update the list rows and the sort buttons in place
+        self.menu_view = self.facade.create_frame(self.main_menu_frame, "#0a014f", 800, 600, relief=tk.FLAT)
+
+        self.navigation_frame = self.facade.create_frame(self.menu_view, "#060c44", 800, 95, relief=tk.RAISED)
         self.navigation_frame.place(x=0, y=0)
 
         self.search_frame = self.facade.create_frame(self.navigation_frame, "#060c44", 320, 30, relief=tk.RAISED)
@@ -115,111 +268,172 @@ class INotesApplication(tk.Tk):
         self.search_input_entry = self.facade.create_entry(self.search_frame, "Search your notes...", "", 50)
         self.search_input_entry.pack(padx=8, pady=8)
         self.search_input_entry.bind("<Return>", lambda event: self.search_word())
+        self.search_input_entry.bind("<Key>", lambda event: self.worker.cancel("search"))
         self.search_input_entry.focus_set()
 
         self.search_button = self.facade.create_button(self.navigation_frame, "Search", 7, "flat", "#043edc", "white", command=lambda: self.search_word())
         self.search_button.place(x=713, y=60)
 
-        self.side_frame = self.facade.create_frame(self.main_menu_frame, "#000066", 160, 600, relief=tk.RAISED)
+        self.side_frame = self.facade.create_frame(self.menu_view, "#000066", 160, 600, relief=tk.RAISED)
         self.side_frame.place(x=0, y=95)
 
         self.credits_label = self.facade.create_label(self.side_frame, "© iNotes by Izyne Gallardo", ("Arial", 8), "#000066", "white")
         self.credits_label.place(x=12, y=475)
 
-        self.name_asc_button = self.facade.create_button(self.main_menu_frame, "Name     ↑", 7, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[0], True))
+        self.results_frame = self.facade.create_frame(self.side_frame, "#000066", 160, 450, relief=tk.FLAT)
+        self.results_frame.place(x=0, y=0)
+
+        self.status_label = self.facade.create_label(self.side_frame, "", ("Arial", 8), "#000066", "white")
+        self.status_label.place(x=4, y=455)
+
+        self.name_asc_button = self.facade.create_button(self.menu_view, "Name     ↑", 7, "flat", "#0a014f", "white", command=lambda: self.sort_menu("name", True))
         self.name_asc_button.place(x=245, y=100)
 
-        self.date_asc_button = self.facade.create_button(self.main_menu_frame, "Date modified   ↑", 11, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[1], True))
+        self.date_asc_button = self.facade.create_button(self.menu_view, "Date modified   ↑", 11, "flat", "#0a014f", "white", command=lambda: self.sort_menu("date", True))
         self.date_asc_button.place(x=425, y=100)
 
-        self.size_asc_button = self.facade.create_button(self.main_menu_frame, "Size   ↑", 4, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[2], True))
+        self.size_asc_button = self.facade.create_button(self.menu_view, "Size   ↑", 4, "flat", "#0a014f", "white", command=lambda: self.sort_menu("size", True))
         self.size_asc_button.place(x=655, y=100)
 
-        self.name_desc_button = self.facade.create_button(self.main_menu_frame, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[0], False))
+        self.name_desc_button = self.facade.create_button(self.menu_view, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu("name", False))
         self.name_desc_button.place(x=300, y=100)
 
-        self.date_desc_button = self.facade.create_button(self.main_menu_frame, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[1], False))
+        self.date_desc_button = self.facade.create_button(self.menu_view, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu("date", False))
         self.date_desc_button.place(x=512, y=100)
 
-        self.size_desc_button = self.facade.create_button(self.main_menu_frame, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu(lambda x: x[2], False))
+        self.size_desc_button = self.facade.create_button(self.menu_view, "↓", 1, "flat", "#0a014f", "white", command=lambda: self.sort_menu("size", False))
         self.size_desc_button.place(x=690, y=100)
 
-        self.add_note_button = self.facade.create_button(self.main_menu_frame, "+", 3, "raised", "#043edc", "#fae0e4", command=self.create_new_note)
+        self.add_note_button = self.facade.create_button(self.menu_view, "+", 3, "raised", "#043edc", "#fae0e4", command=self.create_new_note)
         self.add_note_button.config(font=("Arial", 20))
         self.add_note_button.place(x=714, y=520)
 
-        self.documents_folder = os.path.expanduser("~/Documents")
-        files = os.listdir(self.documents_folder)
-        self.text_files = [file for file in files if file.endswith('.txt')]
-
-        num_notes = len(self.text_files)
-        
-        print("Number of existing notes:", num_notes)
-        print("Number of new notes:", len(self.notes.get_memo()))
-        for note in self.notes.get_memo():
-            print("Note:", note.get_name())
-            print("Date:", note.get_date_modified())
-            print("Size:", note.get_size())
-
-        for file_name in self.text_files:
-            file_path = os.path.join(self.documents_folder, file_name)
-            file_date_modified = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%m/%d/%Y %I:%M %p")
-            file_size = os.path.getsize(file_path)
-            self.file_names.append(file_name[:-4])
-            self.file_dates.append(file_date_modified)
-            self.file_sizes.append(file_size)
-
-        files_info = [(name, date, size) for name, date, size in zip(self.file_names, self.file_dates, self.file_sizes)]
-
-        if is_reversed:
-            sorted_files_info = self.bubble_sort(files_info, key=sort_key)
-        else:
-            sorted_files_info = self.bubble_sort_reversed(files_info, key=sort_key)
-
-        for file_no, (file_name, file_date, file_size) in enumerate(sorted_files_info):
-            file_size_kb = file_size / 1024.0
-            file_size_str = f"{file_size_kb:.2f} KB"
-            new_note_button = self.facade.create_button(self.main_menu_frame, file_name, 26, "flat", "#060c44", "white", command=lambda note_name=file_name: self.display_text_editor(note_name))
-            new_note_button.place(x=175, y=130 + file_no * 30)
-            date_modified_label = self.facade.create_label(self.main_menu_frame, file_date, ("Arial", 10), "#0a014f", "white")
-            date_modified_label.place(x=410, y=130 + file_no * 30)
-            file_size_label = self.facade.create_label(self.main_menu_frame, file_size_str, ("Arial", 10), "#0a014f", "white")
-            file_size_label.place(x=650, y=130 + file_no * 30)
+        self.sort_buttons = {
+            ("name", True): self.name_asc_button,
+            ("date", True): self.date_asc_button,
+            ("size", True): self.size_asc_button,
+            ("name", False): self.name_desc_button,
+            ("date", False): self.date_desc_button,
+            ("size", False): self.size_desc_button,
+        }
+
+        self.note_list_view = NoteListView(self.facade, self.menu_view, self.store.listing, self.display_text_editor, 620, 390)
+        self.note_list_view.place(160, 128, 780)
+        self.add_note_button.lift()
+
+    def close_editor(self):
+        self.flush_autosave()
+        self.current_note = None
+        if self.finder is not None:
+            self.finder.cancel()
+            self.finder = None
+        if self.text_loader is not None:
+            self.text_loader.close()
+            self.text_loader = None
+        if self.editor_view is not None:
+            self.editor_view.destroy()
+            self.editor_view = None
+
+    @metrics.timed("display_main_menu")
+    def display_main_menu(self, sort_key="date", is_reversed=False):
+        self.close_editor()
+        if self.menu_view is None:
+            self.build_main_menu()
+        self.menu_view.pack(fill=tk.BOTH, expand=True)
+        self.current_sort_method = sort_key
+
+        for (button_key, button_order), button in self.sort_buttons.items():
+            active = button_key == sort_key and button_order == is_reversed
+            button.config(bg="#043edc" if active else "#0a014f")
+
+        # Draw from what is already listed, the notes are rescanned in the background
+        self.store.set_sort_key(sort_key)
+
+        # is_reversed selects ascending order, the default listing is newest/largest/last first
+        self.note_list_view.show(descending=not is_reversed)
+
+        if self.listing_loaded and self.store.watcher is not None:
+            # The watcher keeps the listing current, nothing to rescan
+            return
+        self.show_status("Scanning notes...")
+        self.worker.submit("scan", lambda token, emit, progress: self.store.scan(), on_done=self.apply_scan)
+
+    def apply_scan(self, result):
+        self.store.apply_scan(result)
+        self.note_list_view.render()
+        self.show_status("")
+        if not self.listing_loaded:
+            self.listing_loaded = True
+            self.start_watching()
+
+    def start_watching(self):
+        if self.watch_interval is not None and self.store.start_watching():
+            self.after(self.watch_interval, self.poll_watcher)
+
+    def poll_watcher(self):
+        # A batch is read on a worker while the next one collects in the watcher
+        if self.store.watcher is None:
+            return
+        if not self.worker.is_busy("watch"):
+            changes = self.store.take_changes()
+            if changes is not None:
+                self.worker.submit("watch", lambda token, emit, progress: self.store.read_changes(changes, token), on_done=self.apply_changes)
+        self.after(self.watch_interval, self.poll_watcher)
+
+    def apply_changes(self, result):
+        self.store.apply_changes(result)
+        self.note_list_view.render()
+
+    def revalidate_note(self, note_name):
+        # Notes edited in place by other programs keep the directory mtime, catch them when opened
+        entry, stale = self.store.revalidate(note_name)
+        if entry is None:
+            return None
+        if stale:
+            self.worker.submit(f"index:{note_name}", lambda token, emit, progress: self.store.reindex(note_name, entry[0]))
+        return entry[1]
 
     def search_word(self):
-        self.clear_widgets(self.side_frame)
-        self.credits_label = self.facade.create_label(self.side_frame, "© iNotes by Izyne Gallardo", ("Arial", 8), "#000066", "white")
-        self.credits_label.place(x=12, y=475)
-
-        search_text = self.search_input_entry.get().strip().lower()
-        result_found = False
-
-        for file_name in self.text_files:
-            # Read the content of the text file
-            file_path = os.path.join(self.documents_folder, file_name)
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-
-            words = content.split()
-
-            for word in words:
-                word_stripped = word.strip().strip().lower()
-                edit_distance = self.edit_distance(search_text, word_stripped)
-
-                if edit_distance == 0:  # Set a threshold for edit distance
-                    # Found a match, do something (e.g., highlight the word, display the file name, etc.)
-                    self.reuslt_label = self.facade.create_label(self.side_frame, f"Match found: {word_stripped}", ("Arial", 10), "#000066", "white")
-                    self.reuslt_label.place(x=4, y=50)
-                    self.reuslt_location_label = self.facade.create_label(self.side_frame, f"In file: {file_name}", ("Arial", 10), "#000066", "white")
-                    self.reuslt_location_label.place(x=4, y=70)
-                    result_found = True
-                    break
-
-                if result_found:
-                    break
-
-        if not result_found:
-            self.reuslt_label = self.facade.create_label(self.side_frame, f"No items match your search.", ("Arial", 8), "#000066", "white")
+        self.clear_widgets(self.results_frame)
+        self.search_result_count = 0
+
+        # Not lowercased, AND/OR/NOT are only operators in capitals; matching ignores case anyway
+        search_text = self.search_input_entry.get().strip()
+        if not search_text:
+            self.worker.cancel("search")
+            self.finish_search(None)
+            return
+
+        def job(token, emit, progress):
+            with metrics.span("search_word"):
+                found = 0
+                try:
+                    for batch in self.store.search_batches(search_text, self.search_result_limit, self.search_max_distance, token):
+                        if token.cancelled:
+                            return
+                        emit(batch)
+                        found += len(batch)
+                        progress(found, self.search_result_limit)
+                except QueryError as error:
+                    return str(error)
+
+        self.show_status("Searching...")
+        self.worker.submit("search", job, on_batch=self.add_search_results, on_progress=lambda done, total: self.show_status(f"Searching... {done}/{total}"), on_done=self.finish_search)
+
+    def add_search_results(self, results):
+        for result in results:
+            result_no = self.search_result_count
+            result_button = self.facade.create_button(self.results_frame, result.name, 19, "flat", "#060c44", "white", command=lambda result=result: self.display_text_editor(result.name, result.offset, result.length))
+            result_button.place(x=4, y=10 + result_no * 46)
+            snippet_label = self.facade.create_label(self.results_frame, result.snippet[:34], ("Arial", 7), "#000066", "white")
+            snippet_label.place(x=4, y=36 + result_no * 46)
+            self.search_result_count += 1
+
+    def finish_search(self, error):
+        # The search job returns an error message for a query that can not be parsed
+        self.show_status(error or "")
+        if not self.search_result_count and not error:
+            self.reuslt_label = self.facade.create_label(self.results_frame, f"No items match your search.", ("Arial", 8), "#000066", "white")
             self.reuslt_label.place(x=4, y=50)
 
     def create_new_note(self):
@@ -235,93 +449,220 @@ class INotesApplication(tk.Tk):
         self.create_button = self.facade.create_button(self.new_note_window, "Create", "10", "raised", "#043edc", "white", command=lambda: [self.display_text_editor(self.note_name_entry.get()), self.new_note_window.destroy()])
         self.create_button.place(x=160, y=250)
 
-    def display_text_editor(self, note_name):
-        self.clear_widgets(self.main_menu_frame)
-        
-        self.note_title_label = self.facade.create_label(self.main_menu_frame, f"{note_name}.txt", ("Arial", 10), "#0a014f", "white")
+    @metrics.timed("display_text_editor")
+    def display_text_editor(self, note_name, position=None, length=0):
+        if self.menu_view is not None:
+            self.menu_view.pack_forget()
+        self.close_editor()
+        self.editor_view = self.facade.create_frame(self.main_menu_frame, "#0a014f", 800, 600, relief=tk.FLAT)
+        self.editor_view.pack(fill=tk.BOTH, expand=True)
+
+        self.note_title_label = self.facade.create_label(self.editor_view, f"{note_name}.txt", ("Arial", 10), "#0a014f", "white")
         self.note_title_label.pack(pady=10)
 
-        self.documents_folder = os.path.expanduser("~/Documents")
-        self.file_path = os.path.join(self.documents_folder, f"{note_name}.txt")
+        self.current_note = note_name
 
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-        else:
-            content = ""
+        file_size = self.revalidate_note(note_name)
 
-        self.find_input_entry = self.facade.create_entry(self.main_menu_frame, "Find...", "", 20)
+        self.find_input_entry = self.facade.create_entry(self.editor_view, "Find...", "", 20)
         self.find_input_entry.place(x=590, y=12)
         self.find_input_entry.bind("<Return>", lambda event: find_word())
+        self.find_input_entry.bind("<KeyRelease>", lambda event: None if event.keysym == "Return" else self.finder.set_query(self.find_input_entry.get().strip()))
         self.find_input_entry.focus_set()
 
-        self.find_button = self.facade.create_button(self.main_menu_frame, "Find", "8", "raised", "#043edc", "white", command=lambda: find_word())
+        self.find_button = self.facade.create_button(self.editor_view, "Find", "8", "raised", "#043edc", "white", command=lambda: find_word())
         self.find_button.place(x=718, y=8)
 
-        self.text_area = self.facade.create_text_editor(self.main_menu_frame, content, 96, 32)
-        self.text_area.place(x=12, y=40)
+        self.find_count_label = self.facade.create_label(self.editor_view, "", ("Arial", 9), "#0a014f", "white")
+        self.find_count_label.place(x=460, y=12)
+
+        self.find_previous_button = self.facade.create_button(self.editor_view, "▲", "1", "flat", "#0a014f", "white", command=lambda: self.finder.find_previous())
+        self.find_previous_button.place(x=540, y=8)
 
-        self.cancel_button = self.facade.create_button(self.main_menu_frame, "←Back—", "8", "raised", "#043edc", "white", command=lambda:[self.display_main_menu(sort_key=lambda x: x[1], is_reversed=False)])
+        self.find_next_button = self.facade.create_button(self.editor_view, "▼", "1", "flat", "#0a014f", "white", command=lambda: self.finder.find_next())
+        self.find_next_button.place(x=562, y=8)
+
+        self.text_area = self.facade.create_text_editor(self.editor_view, "", 96, 32)
+        self.text_area.place(x=12, y=40)
+        self.finder = EditorFinder(self.text_area, self.find_count_label)
+        self.text_area.bind("<KeyRelease>", lambda event: self.schedule_autosave(), add="+")
+
+        # The note is streamed into the widget instead of being read into one string first
+        if file_size is None:
+            self.text_loader = None
+        elif file_size > self.paged_view_threshold:
+            self.page_label = self.facade.create_label(self.editor_view, "", ("Arial", 9), "#0a014f", "white")
+            self.page_label.place(x=168, y=569)
+            self.text_loader = PagedTextLoader(self.text_area, self.store.open_note(note_name), self.page_label)
+            self.text_loader.on_insert = self.finder.mark_dirty
+            self.previous_page_button = self.facade.create_button(self.editor_view, "◀", "2", "raised", "#043edc", "white", command=lambda: self.text_loader.previous_page())
+            self.previous_page_button.place(x=130, y=565)
+            self.next_page_button = self.facade.create_button(self.editor_view, "▶", "2", "raised", "#043edc", "white", command=lambda: self.text_loader.next_page())
+            self.next_page_button.place(x=290, y=565)
+            if position is not None:
+                position = self.text_loader.show_offset(position)
+            else:
+                self.text_loader.show_page(0)
+        else:
+            self.text_loader = LazyTextLoader(self.text_area, self.store.open_note(note_name))
+            self.text_loader.on_insert = self.finder.mark_dirty
+            self.text_loader.start()
+            if position is not None:
+                self.text_loader.load_until(position + length)
+
+        if position is not None:
+            # Opened from a search result, jump to the hit
+            hit_start = f"1.0+{position}c"
+            self.text_area.tag_add(EditorFinder.CURRENT_TAG, hit_start, f"{hit_start}+{length}c")
+            self.text_area.mark_set(tk.INSERT, hit_start)
+            self.text_area.see(hit_start)
+
+        self.cancel_button = self.facade.create_button(self.editor_view, "←Back—", "8", "raised", "#043edc", "white", command=lambda:[self.display_main_menu(sort_key="date", is_reversed=False)])
         self.cancel_button.place(x=12, y=8)
 
-        self.theme_button = self.facade.create_button(self.main_menu_frame, "Dark Mode", "10", "solid", "#212529", "white", command=lambda:[self.text_area.configure(bg="black"), self.text_area.configure(fg="white")])
+        self.theme_button = self.facade.create_button(self.editor_view, "Dark Mode", "10", "solid", "#212529", "white", command=lambda:[self.text_area.configure(bg="black"), self.text_area.configure(fg="white")])
         self.theme_button.place(x=12, y=565)
 
-        self.save_button = self.facade.create_button(self.main_menu_frame, "Save", "10", "raised", "#043edc", "white", command=lambda:[self.save_note(note_name), self.display_main_menu(sort_key=lambda x: x[1], is_reversed=False)])
+        self.save_button = self.facade.create_button(self.editor_view, "Save", "10", "raised", "#043edc", "white", command=lambda:[self.save_note(note_name), self.display_main_menu(sort_key="date", is_reversed=False)])
         self.save_button.place(x=360, y=565)
+        if isinstance(self.text_loader, PagedTextLoader):
+            self.save_button.config(state=tk.DISABLED)
 
-        self.rename_button = self.facade.create_button(self.main_menu_frame, "Rename", "10", "ridge", "#73e7aa", "black", command=lambda: self.rename_note_dialog(note_name))
+        self.history_button = self.facade.create_button(self.editor_view, "History", "10", "raised", "#043edc", "white", command=lambda: self.history_dialog(note_name))
+        self.history_button.place(x=480, y=565)
+        if isinstance(self.text_loader, PagedTextLoader):
+            self.history_button.config(state=tk.DISABLED)
+
+        self.rename_button = self.facade.create_button(self.editor_view, "Rename", "10", "ridge", "#73e7aa", "black", command=lambda: self.rename_note_dialog(note_name))
         self.rename_button.place(x=600, y=565)
 
-        self.delete_button = self.facade.create_button(self.main_menu_frame, "Delete", "10", "ridge", "#dc3545", "white", command=lambda: self.delete_note_file(note_name))
+        self.delete_button = self.facade.create_button(self.editor_view, "Delete", "10", "ridge", "#dc3545", "white", command=lambda: self.delete_note_file(note_name))
         self.delete_button.place(x=704, y=565)
 
         def find_word():
-            search_text = self.find_input_entry.get().strip().lower()
-            result_found = False
-
-            if search_text:
-                start = "1.0"
-                end = "end"
-                self.text_area.tag_remove("highlight", start, end)
-
-                while True:
-                    start = self.text_area.search(search_text, start, stopindex=end, nocase=True)
-                    if not start:
-                        break
-
-                    end_index = self.text_area.index(f"{start}+{len(search_text)}c")
-                    word = self.text_area.get(start, end_index)
-                    if self.edit_distance(search_text, word.strip().lower()) == 0:
-                        self.text_area.tag_add("highlight", start, end_index)
-                        result_found = True
-
-                    start = end_index
-
-                if result_found:
-                    self.text_area.tag_configure("highlight", background="red")
-                else:
-                    messagebox.showinfo("Search", "No results found.")
+            with metrics.span("find_word"):
+                self.finder.set_query(self.find_input_entry.get().strip(), delay=False)
+            if self.finder.pattern is not None and not self.finder.find_next():
+                messagebox.showinfo("Search", "No results found.")
 
+    @metrics.timed("save_note")
     def save_note(self, note_name):
-        print("Saving note...")
-        print("File path:", self.file_path)
-        print("Content to save:", self.text_area.get("1.0", tk.END))
-        
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "w", encoding="utf-8") as file:
-                file.write(self.text_area.get("1.0", tk.END))
-        else:
-            with open(self.file_path, "w", encoding="utf-8") as file:
-                file.write(self.text_area.get("1.0", tk.END))
-
-        existing_note = next((note for note in self.notes.get_memo() if note.get_name() == note_name), None)
+        if isinstance(self.text_loader, PagedTextLoader):
+            return
+        if self.text_loader is not None:
+            # Everything has to be in the widget before it is written back
+            self.text_loader.finish()
+
+        # Only the snapshot is taken here, the write happens on the saver thread
+        content = self.text_area.get("1.0", "end-1c")
+        self.text_area.edit_modified(False)
+        self.worker.hold()
+        self.store.save(note_name, content, lambda name, result: self.worker.post(self.note_saved, note_name, content, result))
+
+        existing_note = self.notes.find_note(note_name)
         if existing_note:
             existing_note.set_date_modified(datetime.now())
         else:
             new_note = Note(note_name, datetime.now(), datetime.now(), 0, [])
             self.notes.add_note(new_note)
 
+    def note_saved(self, note_name, content, result):
+        self.worker.release()
+        if isinstance(result, Exception):
+            messagebox.showerror("Save Note", f"Could not save {note_name}.txt: {result}")
+            return
+
+        # None when superseded by a newer save, unchanged, or renamed or deleted since the write
+        entry = self.store.note_saved(note_name, result)
+        if entry is None:
+            return
+        if self.editor_view is None:
+            self.note_list_view.render()
+        self.worker.submit(f"index:{note_name}", lambda token, emit, progress: self.store.index_note(note_name, content, entry[0]))
+
+    def schedule_autosave(self):
+        if self.autosave_delay is None or isinstance(self.text_loader, PagedTextLoader):
+            return
+        self.cancel_autosave()
+        self.autosave_id = self.after(self.autosave_delay, self.autosave)
+
+    def cancel_autosave(self):
+        if self.autosave_id is not None:
+            self.after_cancel(self.autosave_id)
+            self.autosave_id = None
+
+    def autosave(self):
+        self.autosave_id = None
+        if self.current_note is not None and self.text_area.edit_modified():
+            self.save_note(self.current_note)
+
+    def flush_autosave(self):
+        if self.autosave_id is not None:
+            self.cancel_autosave()
+            self.autosave()
+
+    def history_dialog(self, note_name):
+        # Versions are recorded by the saver thread, wait for the saves queued so far
+        self.flush_autosave()
+        self.store.saver.flush()
+        versions = self.store.history.versions(note_name)
+
+        self.history_window = self.facade.create_top_level_window("History", "640x420", "#0a014f")
+        self.history_window.grab_set()
+
+        self.version_list = self.facade.create_list_box(self.history_window, 28, 21)
+        self.version_list.place(x=12, y=12)
+        # Newest first
+        for version_no in range(len(versions) - 1, -1, -1):
+            version = versions[version_no]
+            saved_at = datetime.fromtimestamp(version["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            self.version_list.insert(tk.END, f"{version_no + 1}. {saved_at}  {version['size']} chars")
+
+        self.diff_view = self.facade.create_text_editor(self.history_window, "", 50, 22)
+        self.diff_view.place(x=200, y=12)
+        self.diff_view.config(state=tk.DISABLED)
+
+        def selected_version():
+            selection = self.version_list.curselection()
+            return len(versions) - 1 - selection[0] if selection else None
+
+        def show_diff():
+            version_no = selected_version()
+            if version_no is None:
+                return
+            if self.text_loader is not None:
+                self.text_loader.finish()
+            content = self.text_area.get("1.0", "end-1c")
+
+            def done(diff):
+                if not self.history_window.winfo_exists():
+                    return
+                self.diff_view.config(state=tk.NORMAL)
+                self.diff_view.delete("1.0", tk.END)
+                self.diff_view.insert("1.0", diff or "No differences.")
+                self.diff_view.config(state=tk.DISABLED)
+            self.worker.submit("history", lambda token, emit, progress: self.store.history.diff(note_name, version_no, content), on_done=done)
+
+        def restore():
+            version_no = selected_version()
+            if version_no is None:
+                return
+            content = self.store.history.version_content(note_name, version_no)
+            if self.text_loader is not None:
+                self.text_loader.finish()
+            self.text_area.delete("1.0", tk.END)
+            self.text_area.insert("1.0", content)
+            self.finder.mark_dirty(1, self.finder.line_count())
+            # Saving the restored text makes it the newest version, nothing is thrown away
+            self.save_note(note_name)
+            self.history_window.destroy()
+
+        self.diff_button = self.facade.create_button(self.history_window, "Diff", "10", "raised", "#043edc", "white", command=show_diff)
+        self.diff_button.place(x=420, y=385)
+
+        self.restore_button = self.facade.create_button(self.history_window, "Restore", "10", "raised", "#043edc", "white", command=restore)
+        self.restore_button.place(x=530, y=385)
+
     def rename_note_dialog(self, old_name):
         self.rename_window = self.facade.create_top_level_window("Rename Note", "400x150", "#0a014f")
         self.rename_window.grab_set()
@@ -336,54 +677,59 @@ class INotesApplication(tk.Tk):
         self.rename_button.place(x=160, y=100)
 
     def rename_note_file(self, old_name, new_name):
-        old_file_path = os.path.join(self.documents_folder, f"{old_name}.txt")
-        new_file_path = os.path.join(self.documents_folder, f"{new_name}.txt")
-        
-        if os.path.exists(old_file_path):
-            os.rename(old_file_path, new_file_path)
-            self.text_files = [new_name + ".txt" if file_name == old_name + ".txt" else file_name for file_name in self.text_files]
-            
-            # Check if the note is in the memo and update its name
-            note = next((note for note in self.notes.get_memo() if note.get_name() == old_name), None)
-            if note:
-                note.update_name(new_name)
+        # The editor's loader may still hold the note open, Windows refuses to move an open file
+        self.close_editor()
+        try:
+            renamed = self.store.rename(old_name, new_name)
+        except FileExistsError:
+            self.display_main_menu(sort_key="date", is_reversed=False)
+            messagebox.showwarning("Rename Note", f"A note named {new_name!r} already exists.")
+            return
+        except OSError as error:
+            self.display_main_menu(sort_key="date", is_reversed=False)
+            messagebox.showwarning("Rename Note", f"Could not rename the note: {error}")
+            return
+        if renamed:
+            # The stored note is already moved, only the memo entry is renamed
+            self.notes.rename_note(old_name, new_name)
             
-            self.display_main_menu(sort_key=lambda x: x[1], is_reversed=False)
+            self.display_main_menu(sort_key="date", is_reversed=False)
             messagebox.showinfo("Rename Note", "Note renamed successfully.")
         else:
+            self.display_main_menu(sort_key="date", is_reversed=False)
             messagebox.showwarning("Rename Note", "Note file not found.")
 
     def delete_note_file(self, note_name):
-        file_path = os.path.join(self.documents_folder, f"{note_name}.txt")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        self.cancel_autosave()
+        self.close_editor()
+        if self.store.delete(note_name):
             messagebox.showinfo("Delete Note", "Note deleted successfully.")
-            self.display_main_menu(sort_key=lambda x: x[1], is_reversed=False)
-            if note_name in self.notes.get_memo():
-                self.notes.delete_note(note_name)  # Utilize the delete_note method here
+            self.display_main_menu(sort_key="date", is_reversed=False)
+            self.notes.delete_note(note_name)
         else:
+            self.display_main_menu(sort_key="date", is_reversed=False)
             messagebox.showwarning("Delete Note", "Note file not found.")
     
     def sort_menu(self, sort_key, is_reversed):
         self.display_main_menu(sort_key=sort_key, is_reversed=is_reversed)
 
     def sort_name_asc(self):
-        self.sort_menu(lambda x: x[0], True)
+        self.sort_menu("name", True)
 
     def sort_date_asc(self):
-        self.sort_menu(lambda x: x[1], True)
+        self.sort_menu("date", True)
 
     def sort_size_asc(self):
-        self.sort_menu(lambda x: x[2], True)
+        self.sort_menu("size", True)
 
     def sort_name_desc(self):
-        self.sort_menu(lambda x: x[0], False)
+        self.sort_menu("name", False)
 
     def sort_date_desc(self):
-        self.sort_menu(lambda x: x[1], False)
+        self.sort_menu("date", False)
 
     def sort_size_desc(self):
-        self.sort_menu(lambda x: x[2], False)
+        self.sort_menu("size", False)
 
     def clear_widgets(self, frame):
         if not frame:
@@ -394,51 +740,12 @@ class INotesApplication(tk.Tk):
     def run(self):
         self.mainloop()
 
-    ### ALGORITHMS ##
-    def bubble_sort(self, arr, key=lambda x: x[2]):
-        n = len(arr)
-        i = 0
-        while i < n:
-            j = 0
-            while j < n-i-1:
-                if key(arr[j]) > key(arr[j+1]):
-                    arr[j], arr[j+1] = arr[j+1], arr[j]
-                j += 1
-            i += 1
-        return arr
-    
-    def bubble_sort_reversed(self, arr, key=lambda x: x[2]):
-        n = len(arr)
-        i = 0
-        while i < n:
-            j = 0
-            while j < n-i-1:
-                if key(arr[j]) < key(arr[j+1]):
-                    arr[j], arr[j+1] = arr[j+1], arr[j]
-                j += 1
-            i += 1
-        return arr
-
-    def edit_distance(self, s1, s2):
-        m, n = len(s1), len(s2)
-        dp = [[0] * (n + 1) for _ in range(m + 1)]
-
-        for i in range(m + 1):
-            dp[i][0] = i
-
-        for j in range(n + 1):
-            dp[0][j] = j
-
-        for i in range(1, m + 1):
-            for j in range(1, n + 1):
-                cost = 0 if s1[i - 1] == s2[j - 1] else 1
-                dp[i][j] = min(dp[i - 1][j] + 1,
-                            dp[i][j - 1] + 1,
-                            dp[i - 1][j - 1] + cost)
-
-        return dp[m][n]
-
 if __name__ == '__main__':
-    os.system("cls")
-    app = INotesApplication()
+    # INOTES_STORAGE picks the backend: a folder of .txt notes, or a single .db file for large collections.
+    # INOTES_COMPRESS_THRESHOLD stores notes of at least that many bytes compressed.
+    storage_location = os.environ.get("INOTES_STORAGE", os.path.expanduser("~/Documents"))
+    compress_threshold = os.environ.get("INOTES_COMPRESS_THRESHOLD")
+    app = INotesApplication(open_storage(storage_location, int(compress_threshold) if compress_threshold else None))
+    if metrics.enabled and os.environ.get("INOTES_METRICS_PORT"):
+        metrics.serve(int(os.environ["INOTES_METRICS_PORT"]))
     app.run()
@@ -0,0 +1,123 @@
+import hashlib
+import itertools
+import os
+import threading
+
+temp_counter = itertools.count()
+
+def content_hash(content):
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+def stored_hash(storage, name):
+    digest = hashlib.blake2b(digest_size=16)
+    with storage.open_text(name) as file:
+        for chunk in iter(lambda: file.read(1 << 20), ""):
+            digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+def atomic_write(file_path, content):
+    # Write to a hidden temp file next to the note, flush it to disk and rename it over the
+    # note, so a crash leaves either the old or the new content but never half of it
+    folder, file_name = os.path.split(file_path)
+    temp_path = os.path.join(folder, f".{file_name}.{os.getpid()}.{next(temp_counter)}.tmp")
+    try:
+        with open(temp_path, "xb") if isinstance(content, bytes) else open(temp_path, "x", encoding="utf-8") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if hasattr(os, "O_DIRECTORY"):
+        folder_fd = os.open(folder or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(folder_fd)
+        finally:
+            os.close(folder_fd)
+
+class NoteSaver:
+    # Write-behind saver: saves are queued per note and written to the storage by one background
+    # thread. A newer save of the same note replaces an older one that was not written yet.
+    # Callbacks run on the saver thread with (name, result): True when written, False when
+    # skipped because the content did not change, None when superseded, or the raised exception.
+    # A failed write never stops the thread, later saves and flush() keep working.
+    def __init__(self, storage, history=None):
+        self.storage = storage
+        self.history = history
+        self.pending = {}
+        # note name -> (content hash, (mtime, size)) of what is on disk
+        self.hashes = {}
+        self.writing = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="inotes-saver", daemon=True)
+        self.thread.start()
+
+    def save(self, name, content, on_saved=None):
+        with self.condition:
+            superseded = self.pending.get(name)
+            self.pending[name] = (content, on_saved)
+            self.condition.notify_all()
+        if superseded is not None and superseded[1] is not None:
+            superseded[1](name, None)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                name = next(iter(self.pending))
+                content, on_saved = self.pending.pop(name)
+                self.writing = True
+
+            try:
+                result = self.write(name, content)
+            except Exception as error:
+                result = error
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+            if on_saved is not None:
+                on_saved(name, result)
+
+    def write(self, name, content):
+        digest = content_hash(content)
+        # A known hash only holds while the note keeps the (mtime, size) it had when it was taken,
+        # another program may have written it since
+        entry = self.storage.revalidate(name)
+        exists = entry is not None
+        known = self.hashes.get(name)
+        if exists and (known is None or known[1] != entry):
+            known = self.hashes[name] = (stored_hash(self.storage, name), entry)
+        if exists and known[0] == digest:
+            return False
+        if self.history is not None and exists and not self.history.versions(name):
+            # Keep what was there before the first save that history sees
+            self.history.record(name, self.storage.read(name))
+        self.storage.write(name, content)
+        self.hashes[name] = (digest, self.storage.revalidate(name))
+        if self.history is not None:
+            # Recorded on the saver thread so versions keep the order of the saves
+            self.history.record(name, content)
+        return True
+
+    def forget(self, name):
+        with self.condition:
+            self.hashes.pop(name, None)
+
+    def flush(self, timeout=None):
+        # Blocks until everything queued so far is on disk
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from inotes_core import NoteStore
+from inotes_listing import SORT_KEYS
+from inotes_storage import open_storage
+
+# Run it as: python inotes_bench.py --sizes 1000,10000 --save-baseline bench.json
+# and later:  python inotes_bench.py --sizes 1000,10000 --baseline bench.json
+SMALL_NOTE_WORDS = (20, 600)
+LARGE_NOTE_SIZE = 4 * 1024 * 1024
+VOCABULARY_SIZE = 20000
+QUERY_COUNT = 50
+SAVE_COUNT = 50
+
+def make_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+def make_text(rng, vocabulary, word_count):
+    # Zipf-like word frequencies, so a few words are very common as in real prose
+    words = rng.choices(vocabulary, cum_weights=cumulative_weights(len(vocabulary)), k=word_count)
+    lines = []
+    for start in range(0, len(words), 12):
+        lines.append(" ".join(words[start:start + 12]))
+    return "\n".join(lines)
+
+weights_cache = {}
+
+def cumulative_weights(size):
+    if size not in weights_cache:
+        total = 0.0
+        weights = []
+        for rank in range(1, size + 1):
+            total += 1.0 / rank
+            weights.append(total)
+        weights_cache[size] = weights
+    return weights_cache[size]
+
+def make_corpus(store, note_count, rng, vocabulary):
+    # Mostly small notes plus one very large note per thousand
+    storage = store.storage
+    large_count = max(1, note_count // 1000)
+    with storage.transaction():
+        for note_no in range(note_count):
+            if note_no < large_count:
+                block = make_text(rng, vocabulary, 20000)
+                text = block * max(1, LARGE_NOTE_SIZE // len(block))
+            else:
+                text = make_text(rng, vocabulary, rng.randint(*SMALL_NOTE_WORDS))
+            storage.write(f"note {note_no:07d}", text)
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def measure(operation, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "ops_per_s": repeat / sum(samples) if sum(samples) else float("inf"),
+    }
+
+def measure_each(operation, arguments):
+    items = iter(arguments)
+    return measure(lambda: operation(next(items)), len(arguments))
+
+def typo(rng, word):
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[position + 1:]
+
+def sample_pair(rng, text):
+    words = text.split()
+    start = rng.randrange(len(words) - 1)
+    return words[start], words[start + 1]
+
+def run_corpus(note_count, args):
+    rng = random.Random(args.seed + note_count)
+    vocabulary = make_vocabulary(rng)
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="inotes-bench-") as folder:
+        location = os.path.join(folder, "notes.db") if args.storage == "packed" else os.path.join(folder, "notes")
+        os.makedirs(os.path.join(folder, "notes"), exist_ok=True)
+        store = NoteStore(open_storage(location, args.compress_threshold), keep_history=False)
+
+        start = time.perf_counter()
+        make_corpus(store, note_count, rng, vocabulary)
+        report["generate"] = {"runs": 1, "seconds": time.perf_counter() - start}
+
+        # A fresh storage object has no warm cache, the first listing pays for the whole scan
+        store.close()
+        store = NoteStore(open_storage(location, args.compress_threshold), keep_history=False)
+        report["list_cold"] = measure(lambda: store.apply_scan(store.scan()), 1)
+        report["list_warm"] = measure(lambda: store.apply_scan(store.scan()), args.repeat)
+
+        keys = list(SORT_KEYS)
+        for sort_key in keys:
+            # Switching from another key forces a full re-sort
+            other_key = keys[(keys.index(sort_key) + 1) % len(keys)]
+            def sort(sort_key=sort_key, other_key=other_key):
+                store.set_sort_key(other_key)
+                store.set_sort_key(sort_key)
+            report[f"sort_{sort_key}"] = measure(sort, args.repeat)
+
+        start = time.perf_counter()
+        store.build_index()
+        seconds = time.perf_counter() - start
+        report["index_build"] = {"runs": 1, "seconds": seconds, "notes_per_s": note_count / seconds}
+
+        words = rng.sample(vocabulary[:2000], QUERY_COUNT)
+        report["search_exact"] = measure_each(lambda word: list(store.search(f'"{word}"', 10)), words)
+        report["search_fuzzy"] = measure_each(lambda word: list(store.search(typo(rng, word), 10, 1)), words)
+        report["search_ranked"] = measure_each(lambda words: list(store.search(" ".join(words), 10, 0)), [rng.sample(vocabulary[:5000], 3) for _ in range(QUERY_COUNT)])
+        # Word pairs that occur in the small notes, as a phrase and as a regex
+        pairs = [sample_pair(rng, store.storage.read(f"note {note_no:07d}")) for note_no in rng.sample(range(max(1, note_count // 1000), note_count), min(QUERY_COUNT, note_count - 1))]
+        report["search_phrase"] = measure_each(lambda pair: list(store.search(f'"{pair[0]} {pair[1]}"', 10)), pairs)
+        report["search_regex"] = measure_each(lambda pair: list(store.search(f"/{pair[0]}\\s+{pair[1][:3]}\\w*/", 10)), pairs)
+
+        names = [f"note {note_no:07d}" for note_no in rng.sample(range(note_count), min(SAVE_COUNT, note_count))]
+        report["save"] = measure_each(lambda name: store.save_now(name, make_text(rng, vocabulary, 300)), names)
+        store.close()
+    return report
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    # A latency more than `tolerance` and `min_delta_ms` slower than the baseline counts as a regression
+    regressions = []
+    for corpus, operations in results["corpora"].items():
+        for operation, numbers in operations.items():
+            old = baseline["corpora"].get(corpus, {}).get(operation)
+            if not old or "p50_ms" not in numbers or "p50_ms" not in old:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if numbers[metric] > old[metric] * (1 + tolerance) and numbers[metric] - old[metric] > min_delta_ms:
+                    regressions.append(f"{corpus} {operation} {metric}: {old[metric]:.2f} -> {numbers[metric]:.2f}")
+    return regressions
+
+def print_report(note_count, report):
+    print(f"\n{note_count} notes")
+    for operation, numbers in report.items():
+        if "p50_ms" in numbers:
+            print(f"  {operation:<16} p50 {numbers['p50_ms']:9.2f} ms  p99 {numbers['p99_ms']:9.2f} ms  {numbers['ops_per_s']:10.1f} ops/s")
+        else:
+            extra = f"  {numbers['notes_per_s']:10.1f} notes/s" if "notes_per_s" in numbers else ""
+            print(f"  {operation:<16} {numbers['seconds']:9.2f} s{extra}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the iNotes core on synthetic note collections")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated note counts, e.g. 1000,10000,100000")
+    parser.add_argument("--storage", choices=("folder", "packed"), default="folder")
+    parser.add_argument("--compress-threshold", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="slowdowns below this are timer noise")
+    args = parser.parse_args(argv)
+
+    config = {"storage": args.storage, "compress_threshold": args.compress_threshold, "repeat": args.repeat, "seed": args.seed}
+    results = {"config": config, "corpora": {}}
+    for note_count in [int(size) for size in args.sizes.split(",")]:
+        results["corpora"][str(note_count)] = run_corpus(note_count, args)
+        print_report(note_count, results["corpora"][str(note_count)])
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("config") != config:
+            print(f"\nWarning: the baseline was recorded with {baseline.get('config')}")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import io
+import struct
+import zlib
+
+# 0xFF never occurs in UTF-8, so a plain text note can not start like a compressed one
+MAGIC = b"\xffINB1"
+BLOCK_SIZE = 64 * 1024
+# index offset, uncompressed size, block size
+TRAILER = struct.Struct("<QQI")
+
+def compress_blocks(data, block_size=BLOCK_SIZE, level=6):
+    # Every block is compressed on its own, so any part of the note can be read without
+    # inflating what comes before it
+    parts = [MAGIC]
+    offsets = []
+    position = len(MAGIC)
+    for start in range(0, len(data), block_size):
+        block = zlib.compress(data[start:start + block_size], level)
+        offsets.append(position)
+        parts.append(block)
+        position += len(block)
+    parts.append(struct.pack(f"<{len(offsets)}Q", *offsets))
+    parts.append(TRAILER.pack(position, len(data), block_size))
+    return b"".join(parts)
+
+def is_compressed(file):
+    start = file.tell()
+    magic = file.read(len(MAGIC))
+    file.seek(start)
+    return magic == MAGIC
+
+class BlockReader(io.RawIOBase):
+    # Seekable view of the uncompressed bytes, only the block under the read position is inflated
+    def __init__(self, file):
+        self.file = file
+        self.file.seek(0, io.SEEK_END)
+        end = self.file.tell()
+        self.file.seek(end - TRAILER.size)
+        index_offset, self.size, self.block_size = TRAILER.unpack(self.file.read(TRAILER.size))
+        block_count = -(-self.size // self.block_size)
+        self.file.seek(index_offset)
+        self.offsets = list(struct.unpack(f"<{block_count}Q", self.file.read(8 * block_count)))
+        self.offsets.append(index_offset)
+        self.position = 0
+        self.block_no = None
+        self.block = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def load_block(self, block_no):
+        if block_no != self.block_no:
+            self.file.seek(self.offsets[block_no])
+            self.block = zlib.decompress(self.file.read(self.offsets[block_no + 1] - self.offsets[block_no]))
+            self.block_no = block_no
+        return self.block
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        block_no, start = divmod(self.position, self.block_size)
+        data = self.load_block(block_no)[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+def open_blocks(file):
+    return io.TextIOWrapper(io.BufferedReader(BlockReader(file)), encoding="utf-8", errors="replace")
@@ -0,0 +1,266 @@
+import argparse
+import fnmatch
+import io
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from inotes_core import NoteStore
+from inotes_storage import open_storage
+
+# Bulk operations without the GUI, e.g.
+#   python inotes_cli.py import ~/old-notes backup.zip
+#   python inotes_cli.py export notes.tar.gz --match "2024*"
+#   python inotes_cli.py rename "^draft " "" --dry-run
+#   python inotes_cli.py delete "scratch *"
+#   python inotes_cli.py reindex --full
+# The notes location defaults to INOTES_STORAGE like the app, ~/Documents when unset.
+ARCHIVE_MODES = {".zip": None, ".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz", ".tar.bz2": "w:bz2", ".tar.xz": "w:xz"}
+
+class Throughput:
+    def __init__(self, action):
+        self.action = action
+        self.start = time.perf_counter()
+        self.notes = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def add(self, notes, size):
+        self.notes += notes
+        self.bytes += size
+
+    def report(self):
+        seconds = max(time.perf_counter() - self.start, 1e-9)
+        megabytes = self.bytes / (1024 * 1024)
+        if self.bytes:
+            line = f"{self.action} {self.notes} notes ({megabytes:.1f} MB) in {seconds:.2f} s: {self.notes / seconds:.0f} notes/s, {megabytes / seconds:.1f} MB/s"
+        else:
+            line = f"{self.action} {self.notes} notes in {seconds:.2f} s: {self.notes / seconds:.0f} notes/s"
+        if self.skipped:
+            line += f", {self.skipped} skipped"
+        print(line)
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def archive_suffix(path):
+    lower = path.lower()
+    return next((suffix for suffix in ARCHIVE_MODES if lower.endswith(suffix)), None)
+
+def note_name_for(relative_path, suffixes):
+    # Notes are stored flat, folders inside the source become part of the name
+    # Empty, "." and ".." parts come from paths like ./notes/a.txt and add nothing to the name
+    parts = [part for part in re.split(r"[\\/]", relative_path) if part not in ("", ".", "..")]
+    if not parts:
+        return None
+    for suffix in suffixes:
+        if parts[-1].lower().endswith(suffix):
+            parts[-1] = parts[-1][:-len(suffix)]
+            return " - ".join(parts) if parts[-1] else None
+    return None
+
+def iter_sources(paths, suffixes):
+    # Yields (note name, loader); loaders of folder and zip members are called on the workers
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folder_names, file_names in os.walk(path):
+                folder_names[:] = [name for name in folder_names if not name.startswith(".")]
+                for file_name in sorted(file_names):
+                    file_path = os.path.join(folder, file_name)
+                    name = note_name_for(os.path.relpath(file_path, path), suffixes)
+                    if name is not None:
+                        yield name, lambda file_path=file_path: read_file(file_path)
+        elif zipfile.is_zipfile(path):
+            archive = zipfile.ZipFile(path)
+            for member in archive.infolist():
+                name = None if member.is_dir() else note_name_for(member.filename, suffixes)
+                if name is not None:
+                    yield name, lambda member=member, archive=archive: archive.read(member)
+        elif tarfile.is_tarfile(path):
+            # Tar members are read in order, a compressed tar can not be read in parallel
+            with tarfile.open(path, "r:*") as archive:
+                for member in archive:
+                    name = note_name_for(member.name, suffixes) if member.isfile() else None
+                    if name is not None:
+                        data = archive.extractfile(member).read()
+                        yield name, lambda data=data: data
+        else:
+            raise SystemExit(f"{path}: not a folder, zip or tar archive")
+
+def read_file(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+def import_notes(store, args, pool):
+    stats = Throughput("Would import" if args.dry_run else "Imported")
+    existing = set(store.listing.catalog)
+    seen = set()
+    suffixes = tuple(suffix.lower() for suffix in args.suffixes.split(","))
+    for batch in batched(iter_sources(args.sources, suffixes), args.batch):
+        accepted = []
+        for name, loader in batch:
+            name = args.prefix + name
+            if name in seen or (name in existing and not args.overwrite):
+                stats.skipped += 1
+                continue
+            seen.add(name)
+            accepted.append((name, loader))
+        items = list(pool.map(lambda item: (item[0], item[1]().decode("utf-8", errors="replace")), accepted))
+        if not args.dry_run:
+            store.write_batch(items, pool)
+        stats.add(len(items), sum(len(content) for _, content in items))
+    stats.report()
+
+def selected_notes(store, patterns):
+    names = sorted(store.listing.catalog)
+    if not patterns:
+        return names
+    return [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+def export_notes(store, args, pool):
+    stats = Throughput("Exported")
+    names = selected_notes(store, args.match)
+    suffix = archive_suffix(args.destination)
+    if suffix == ".zip":
+        archive = zipfile.ZipFile(args.destination, "w", zipfile.ZIP_DEFLATED)
+        add = lambda name, data: archive.writestr(f"{name}.txt", data)
+    elif suffix is not None:
+        archive = tarfile.open(args.destination, ARCHIVE_MODES[suffix])
+        def add(name, data):
+            info = tarfile.TarInfo(f"{name}.txt")
+            info.size = len(data)
+            info.mtime = time.time()
+            archive.addfile(info, io.BytesIO(data))
+    else:
+        archive = None
+        os.makedirs(args.destination, exist_ok=True)
+
+    try:
+        for batch in batched(names, args.batch):
+            contents = list(pool.map(lambda name: store.read_or_none(name), batch))
+            items = [(name, content.encode("utf-8")) for name, content in zip(batch, contents) if content is not None]
+            stats.skipped += len(batch) - len(items)
+            if archive is None:
+                list(pool.map(lambda item: write_file(os.path.join(args.destination, f"{item[0]}.txt"), item[1]), items))
+            else:
+                # Archives are written from one thread, only the reads run in parallel
+                for name, data in items:
+                    add(name, data)
+            stats.add(len(items), sum(len(data) for _, data in items))
+    finally:
+        if archive is not None:
+            archive.close()
+    stats.report()
+
+def write_file(file_path, data):
+    with open(file_path, "wb") as file:
+        file.write(data)
+
+def rename_notes(store, args, pool):
+    stats = Throughput("Would rename" if args.dry_run else "Renamed")
+    pattern = re.compile(args.pattern)
+    names = set(store.listing.catalog)
+    renames = []
+    targets = set()
+    for name in sorted(names):
+        new_name = pattern.sub(args.replacement, name)
+        if new_name == name:
+            continue
+        # Never overwrite: the new name must be free and valid, and not claimed by another rename
+        if not new_name.strip() or re.search(r"[\\/]", new_name) or new_name in names or new_name in targets:
+            print(f"Skipping {name!r}: can not rename to {new_name!r}", file=sys.stderr)
+            stats.skipped += 1
+            continue
+        targets.add(new_name)
+        renames.append((name, new_name))
+
+    for batch in batched(renames, args.batch):
+        if args.dry_run:
+            for old_name, new_name in batch:
+                print(f"{old_name} -> {new_name}")
+        else:
+            store.rename_batch(batch)
+        stats.add(len(batch), 0)
+    stats.report()
+
+def delete_notes(store, args, pool):
+    stats = Throughput("Would delete" if args.dry_run else "Deleted")
+    names = selected_notes(store, args.patterns)
+    for batch in batched(names, args.batch):
+        if args.dry_run:
+            for name in batch:
+                print(name)
+        else:
+            store.delete_batch(batch)
+        stats.add(len(batch), 0)
+    stats.report()
+
+def reindex_notes(store, args, pool):
+    stats = Throughput("Indexed")
+    def progress(done, total):
+        print(f"\rIndexing {done}/{total}", end="", file=sys.stderr, flush=True)
+    stats.add(store.rebuild_index(args.full, pool, args.batch, progress), 0)
+    print(file=sys.stderr)
+    stats.report()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import, export, rename, delete and reindex iNotes notes")
+    parser.add_argument("--storage", default=os.environ.get("INOTES_STORAGE", os.path.expanduser("~/Documents")), help="notes folder, or a .db file")
+    parser.add_argument("--compress-threshold", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=8, help="parallel I/O threads")
+    parser.add_argument("--batch", type=int, default=500, help="notes per batch; the listing and index are updated once per batch")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="import notes from folders and zip/tar archives")
+    command.add_argument("sources", nargs="+")
+    command.add_argument("--suffixes", default=".txt", help="comma separated file suffixes to import")
+    command.add_argument("--prefix", default="", help="put in front of every imported note name")
+    command.add_argument("--overwrite", action="store_true", help="replace notes that already exist instead of skipping them")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=import_notes)
+
+    command = commands.add_parser("export", help="export notes to a folder or a .zip/.tar[.gz|.bz2|.xz] archive")
+    command.add_argument("destination")
+    command.add_argument("--match", action="append", help="glob on note names, may be repeated")
+    command.set_defaults(run=export_notes)
+
+    command = commands.add_parser("rename", help="rename every note whose name matches a regular expression")
+    command.add_argument("pattern")
+    command.add_argument("replacement", help="re.sub replacement, \\1 refers to groups")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=rename_notes)
+
+    command = commands.add_parser("delete", help="delete every note whose name matches one of the globs")
+    command.add_argument("patterns", nargs="+")
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=delete_notes)
+
+    command = commands.add_parser("reindex", help="bring the search index up to date")
+    command.add_argument("--full", action="store_true", help="drop the index and rebuild it from every note")
+    command.set_defaults(run=reindex_notes)
+
+    args = parser.parse_args(argv)
+    store = NoteStore(open_storage(args.storage, args.compress_threshold))
+    try:
+        store.apply_scan(store.scan())
+        if args.command in ("import", "rename", "delete"):
+            # Loaded up front so the batches can update it in memory, it is written once by close()
+            store.ensure_index()
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="inotes-cli") as pool:
+            args.run(store, args, pool)
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import heapq
+import json
+import os
+import threading
+from inotes_autosave import NoteSaver, atomic_write
+from inotes_history import HistoryStore
+from inotes_index import InvertedIndex
+from inotes_listing import SORT_KEYS, SortedListing
+from inotes_metrics import metrics
+from inotes_query import QueryEngine, is_structured
+from inotes_search import SearchEngine
+
+# Rows kept for painting the first screen of the next start, a little over one page
+SNAPSHOT_ROWS = 50
+
+class NoteStore:
+    # Everything iNotes does with notes, without any widgets: listing, sorting, indexing, search,
+    # saving, renaming and deleting. Methods run on the calling thread; the GUI decides which
+    # ones go to background workers.
+    def __init__(self, storage, executor=None, keep_history=True):
+        self.storage = storage
+        self.history = HistoryStore(storage) if keep_history else None
+        self.saver = NoteSaver(storage, self.history)
+        self.listing = SortedListing()
+        self.index = InvertedIndex(storage)
+        self.search_engine = SearchEngine(self.index, storage, executor)
+        self.query_engine = QueryEngine(self.index, storage)
+        self.index_ready = False
+        self.index_lock = threading.Lock()
+        self.watcher = None
+
+    def load_snapshot(self, sort_key="date", descending=True):
+        # The first rows of the last listing, so a window can be painted before any note
+        # metadata is read. Returns the number of notes the snapshot was taken from, or None.
+        try:
+            with open(self.storage.metadata_path("snapshot.json"), "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("sort_key") != sort_key or data.get("descending") != descending:
+            return None
+        self.listing.set_sort_key(sort_key)
+        self.listing.load({name: (mtime, size) for name, mtime, size in data["rows"]})
+        return data["total"]
+
+    def save_snapshot(self, sort_key="date", descending=True):
+        make_key = SORT_KEYS[sort_key]
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        records = pick(SNAPSHOT_ROWS, self.listing.catalog.records.values(), key=lambda record: make_key(record.name, record.mtime, record.size))
+        data = {"sort_key": sort_key, "descending": descending, "total": len(self.listing), "rows": [[record.name, record.mtime, record.size] for record in records]}
+        path = self.storage.metadata_path("snapshot.json")
+        # A new packed store has no metadata folder until something else writes there
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(data, separators=(",", ":")))
+
+    @metrics.timed("scan")
+    def scan(self):
+        # Runs on a worker. When most of the listing would change, as on the first scan after a
+        # snapshot, the new listing is also sorted here so apply_scan only has to swap it in.
+        entries = self.storage.list_notes()
+        listing = None
+        if self.listing.needs_rebuild(abs(len(entries) - len(self.listing))):
+            listing = SortedListing(self.listing.sort_key)
+            listing.load(entries)
+        return entries, listing
+
+    def apply_scan(self, result):
+        entries, listing = result
+        if listing is not None and listing.sort_key == self.listing.sort_key:
+            self.listing.replace(listing)
+        else:
+            self.listing.sync(entries)
+        return self.listing
+
+    def start_watching(self, use_inotify=True):
+        # Changes made by other programs are collected from now on, see take_changes()
+        if self.watcher is None:
+            self.watcher = self.storage.watch(use_inotify)
+        return self.watcher is not None
+
+    def take_changes(self):
+        return self.watcher.take_changes() if self.watcher is not None else None
+
+    def read_changes(self, changes, token=None):
+        # Worker side of a watcher batch: fresh metadata of every changed note, and the index
+        # brought up to date. Large batches fall back to one scan.
+        file_names, rescan = changes
+        if rescan or self.listing.needs_rebuild(len(file_names)):
+            result = self.scan()
+            if self.index_ready:
+                self.index.refresh(result[0], token)
+            return result, []
+        updates = []
+        for name in {self.storage.note_name(file_name) for file_name in file_names} - {None}:
+            entry = self.storage.revalidate(name)
+            if self.index_ready:
+                if entry is None:
+                    self.index.remove_note(name)
+                elif self.index.notes.get(name, {}).get("mtime") != entry[0]:
+                    try:
+                        self.index.add_stored(name, entry[0])
+                    except OSError:
+                        pass
+            updates.append((name, entry))
+        return None, updates
+
+    def apply_changes(self, result):
+        # Tk side of a watcher batch, only the rows that changed are touched
+        scan_result, updates = result
+        if scan_result is not None:
+            return self.apply_scan(scan_result)
+        return self.update_listing(dict(updates))
+
+    def update_listing(self, changed):
+        # changed: {name: (mtime, size), or None for a removed note}
+        if self.listing.needs_rebuild(len(changed)):
+            self.listing.load(self.storage.cached_notes())
+            return self.listing
+        for name, entry in changed.items():
+            if entry is None:
+                self.listing.remove(name)
+            else:
+                self.listing.update(name, *entry)
+        return self.listing
+
+    def set_sort_key(self, sort_key):
+        self.listing.set_sort_key(sort_key)
+
+    @metrics.timed("build_index")
+    def build_index(self, token=None, progress=None):
+        # Built once from the stored notes, afterwards only notes changed outside the app are re-read.
+        # list_notes and not cached_notes: before the first scan the cache may still be empty.
+        self.index.load()
+        self.index.refresh(self.storage.list_notes(), token, progress)
+        self.index.save()
+        self.index_ready = token is None or not token.cancelled
+
+    def rebuild_index(self, full=False, executor=None, batch_size=256, progress=None):
+        # Bulk variant of build_index for scripts: stale notes are read in parallel batches and
+        # the index file is written once at the end. Returns how many notes were (re)indexed.
+        with self.index_lock:
+            if full:
+                self.index.clear()
+            else:
+                self.index.load()
+            entries = self.storage.list_notes()
+            for name in [name for name in self.index.notes if name not in entries]:
+                self.index.remove_note(name)
+            stale = [(name, mtime) for name, (mtime, size) in entries.items() if self.index.notes.get(name, {}).get("mtime") != mtime]
+            read = executor.map if executor is not None else map
+            for start in range(0, len(stale), batch_size):
+                batch = stale[start:start + batch_size]
+                for (name, mtime), content in zip(batch, read(self.read_or_none, [name for name, _ in batch])):
+                    if content is not None:
+                        self.index.add_note(name, content, mtime)
+                if progress is not None:
+                    progress(start + len(batch), len(stale))
+            self.index.save()
+            self.index_ready = True
+            return len(stale)
+
+    def read_or_none(self, name):
+        try:
+            return self.storage.read(name)
+        except OSError:
+            return None
+
+    def ensure_index(self, token=None, progress=None):
+        # Loading the index is deferred until a search needs it or the app is idle
+        with self.index_lock:
+            if not self.index_ready:
+                self.build_index(token, progress)
+
+    def revalidate(self, name):
+        # Returns (mtime, size) or None, and whether the index has an older version of the note
+        entry = self.storage.revalidate(name)
+        if entry is None:
+            return None, False
+        self.listing.update(name, *entry)
+        return entry, self.index.notes.get(name, {}).get("mtime") != entry[0]
+
+    def reindex(self, name, mtime):
+        self.index.add_stored(name, mtime)
+
+    def open_note(self, name):
+        return self.storage.open_text(name)
+
+    def search_batches(self, query, limit=10, max_distance=1, token=None):
+        # Phrases, operators, prefixes and regexes go to the query engine, plain words are ranked
+        # through the index with typo tolerance. Yields lists of SearchResult.
+        self.ensure_index(token)
+        if is_structured(query):
+            yield from self.query_engine.iter_batches(query, limit, token)
+            return
+        for result in self.search_engine.iter_search(query, limit, max_distance):
+            yield [result]
+
+    def search(self, query, limit=10, max_distance=1, token=None):
+        for batch in self.search_batches(query, limit, max_distance, token):
+            yield from batch
+
+    def save(self, name, content, on_saved=None):
+        # Queued on the saver thread; on_saved gets (name, result) like NoteSaver callbacks
+        self.saver.save(name, content, on_saved)
+
+    def note_saved(self, name, result):
+        # Listing part of a finished save, returns the new (mtime, size) when the note was written
+        if not result or isinstance(result, Exception):
+            return None
+        entry = self.storage.revalidate(name)
+        if entry is not None:
+            self.listing.update(name, *entry)
+        return entry
+
+    def index_note(self, name, content, mtime):
+        # Rewriting the whole index file per save would cost more than the save itself. It is
+        # written by build_index and close; after a crash refresh() re-reads the notes whose
+        # mtime no longer matches the index.
+        self.index.add_note(name, content, mtime)
+
+    def save_now(self, name, content):
+        # Synchronous save for scripts and benchmarks
+        results = []
+        done = threading.Event()
+        def on_saved(name, result):
+            results.append(result)
+            done.set()
+        self.saver.save(name, content, on_saved)
+        done.wait()
+        result = results[0]
+        if isinstance(result, Exception):
+            raise result
+        entry = self.note_saved(name, result)
+        if entry is not None:
+            self.index_note(name, content, entry[0])
+        return entry
+
+    def rename(self, old_name, new_name):
+        # Pending writes must land under the old name before the note moves
+        self.saver.flush()
+        if not self.storage.exists(old_name):
+            return False
+        if new_name == old_name:
+            return True
+        # Raises FileExistsError when the new name is taken, before history or the index move
+        self.storage.rename(old_name, new_name)
+        self.saver.forget(old_name)
+        if self.history is not None:
+            self.history.rename(old_name, new_name)
+        self.index.rename_note(old_name, new_name)
+        self.listing.rename(old_name, new_name)
+        return True
+
+    def delete(self, name):
+        self.saver.flush()
+        self.saver.forget(name)
+        if not self.storage.exists(name):
+            return False
+        self.storage.delete(name)
+        if self.history is not None:
+            self.history.delete(name)
+        self.index.remove_note(name)
+        self.listing.remove(name)
+        return True
+
+    def write_batch(self, items, executor=None):
+        # Bulk writes of [(name, content), ...] in one storage transaction, spread over the
+        # executor when the backend allows it. The listing and index are updated once per batch.
+        with self.storage.transaction():
+            if executor is not None and self.storage.concurrent_writes:
+                results = list(executor.map(lambda item: self.storage.write(*item), items))
+            else:
+                results = [self.storage.write(name, content) for name, content in items]
+        if self.index_ready:
+            for (name, content), (mtime, size) in zip(items, results):
+                self.index.add_note(name, content, mtime)
+        changed = {name: result for (name, _), result in zip(items, results)}
+        self.update_listing(changed)
+        return changed
+
+    def rename_batch(self, renames):
+        # [(old name, new name), ...], the caller makes sure no new name is taken
+        self.saver.flush()
+        changed = {}
+        with self.storage.transaction():
+            for old_name, new_name in renames:
+                self.saver.forget(old_name)
+                self.storage.rename(old_name, new_name)
+                if self.history is not None:
+                    self.history.rename(old_name, new_name)
+                self.index.rename_note(old_name, new_name)
+                changed[old_name] = None
+                changed[new_name] = self.storage.revalidate(new_name)
+        self.update_listing(changed)
+        return changed
+
+    def delete_batch(self, names):
+        self.saver.flush()
+        with self.storage.transaction():
+            for name in names:
+                self.saver.forget(name)
+                self.storage.delete(name)
+                if self.history is not None:
+                    self.history.delete(name)
+                self.index.remove_note(name)
+        self.update_listing(dict.fromkeys(names))
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        metrics.close()
+        self.saver.close()
+        self.index.save()
+        self.storage.close()
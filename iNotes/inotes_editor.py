@@ -0,0 +1,271 @@
+import bisect
+import re
+import tkinter as tk
+
+class LazyTextLoader:
+    # Shows the first screenful at once and appends the rest of the note in small idle-time steps
+    FIRST_CHUNK = 16 * 1024
+    CHUNK = 128 * 1024
+    DELAY = 1
+
+    def __init__(self, text_area, file):
+        self.text_area = text_area
+        self.file = file
+        self.loaded = 0
+        self.done = False
+        self.after_id = None
+        # Called with the first and last line of every appended chunk
+        self.on_insert = None
+
+    def start(self):
+        # Text typed at the current end while loading stays ahead of the rest of the note
+        self.text_area.mark_set("loaded_end", "end-1c")
+        self.text_area.mark_gravity("loaded_end", tk.RIGHT)
+        self.load_chunk(self.FIRST_CHUNK)
+        self.text_area.mark_set(tk.INSERT, "1.0")
+        self.schedule()
+
+    def schedule(self):
+        if not self.done:
+            self.after_id = self.text_area.after(self.DELAY, self.load_next)
+
+    def load_next(self):
+        self.after_id = None
+        self.load_chunk(self.CHUNK)
+        self.schedule()
+
+    def load_chunk(self, size):
+        chunk = self.file.read(size)
+        if not chunk:
+            self.close()
+            return
+        first_line = int(self.text_area.index("loaded_end").split(".")[0])
+        # Loading is not an edit: keep the modified flag as the user left it, or autosave would
+        # fire on any key and finish the whole load at once
+        modified = self.text_area.edit_modified()
+        self.text_area.insert("loaded_end", chunk)
+        self.text_area.edit_modified(modified)
+        self.loaded += len(chunk)
+        if self.on_insert is not None:
+            self.on_insert(first_line, int(self.text_area.index("loaded_end").split(".")[0]))
+
+    def load_until(self, offset):
+        while not self.done and self.loaded < offset:
+            self.load_chunk(self.CHUNK)
+
+    def finish(self):
+        while not self.done:
+            self.load_chunk(self.CHUNK)
+
+    def close(self):
+        if self.after_id is not None:
+            self.text_area.after_cancel(self.after_id)
+            self.after_id = None
+        self.file.close()
+        self.done = True
+
+class PagedTextLoader:
+    # Read-only window over a very large note, only one page is ever in the widget
+    PAGE_SIZE = 128 * 1024
+
+    def __init__(self, text_area, file, page_label):
+        self.text_area = text_area
+        self.page_label = page_label
+        self.on_insert = None
+        self.file = file
+        # Text-mode tell() cookies of every page found so far
+        self.page_starts = [self.file.tell()]
+        self.last_page = None
+        self.page = 0
+        self.done = True
+
+    def find_page(self, page):
+        while len(self.page_starts) <= page and self.last_page is None:
+            self.file.seek(self.page_starts[-1])
+            self.file.read(self.PAGE_SIZE)
+            next_start = self.file.tell()
+            if not self.file.read(1):
+                self.last_page = len(self.page_starts) - 1
+            else:
+                self.page_starts.append(next_start)
+        return min(page, len(self.page_starts) - 1)
+
+    def show_page(self, page):
+        page = self.find_page(max(0, page))
+        self.file.seek(self.page_starts[page])
+        text = self.file.read(self.PAGE_SIZE)
+        self.page = page
+
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.delete("1.0", tk.END)
+        self.text_area.insert("1.0", text)
+        self.text_area.edit_modified(False)
+        self.text_area.config(state=tk.DISABLED)
+        if self.on_insert is not None:
+            self.on_insert(1, int(self.text_area.index("end-1c").split(".")[0]))
+
+        total = f"{self.last_page + 1}" if self.last_page is not None else "?"
+        self.page_label.config(text=f"Page {page + 1} of {total}")
+
+    def show_offset(self, offset):
+        # Returns the offset relative to the page that holds it
+        self.show_page(offset // self.PAGE_SIZE)
+        return offset - self.page * self.PAGE_SIZE
+
+    def next_page(self):
+        self.show_page(self.page + 1)
+
+    def previous_page(self):
+        self.show_page(self.page - 1)
+
+    def finish(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+class EditorFinder:
+    # Finds every match with one regex pass over the buffer and tags them in batched Tcl calls.
+    # After edits only the touched lines are searched again.
+    TAG = "highlight"
+    CURRENT_TAG = "current_match"
+    DEBOUNCE = 250
+    TAG_BATCH = 1000
+
+    def __init__(self, text_area, count_label):
+        self.text_area = text_area
+        self.count_label = count_label
+        self.query = None
+        self.pattern = None
+        self.after_id = None
+        self.dirty_lines = None
+        self.text_area.tag_configure(self.TAG, background="red")
+        self.text_area.tag_configure(self.CURRENT_TAG, background="orange")
+        self.text_area.tag_raise(self.CURRENT_TAG, self.TAG)
+        self.text_area.bind("<KeyPress>", self.remember_edit, add="+")
+        self.text_area.bind("<KeyRelease>", self.remember_edit, add="+")
+        for event in ("<<Paste>>", "<<Cut>>", "<<Undo>>", "<<Redo>>"):
+            self.text_area.bind(event, lambda event: self.mark_dirty(1, self.line_count()), add="+")
+
+    def line_count(self):
+        return int(self.text_area.index("end-1c").split(".")[0])
+
+    def remember_edit(self, event):
+        line = int(self.text_area.index(tk.INSERT).split(".")[0])
+        self.mark_dirty(line, line)
+
+    def mark_dirty(self, first_line, last_line):
+        if self.pattern is None:
+            return
+        if self.dirty_lines is not None:
+            first_line = min(first_line, self.dirty_lines[0])
+            last_line = max(last_line, self.dirty_lines[1])
+        self.dirty_lines = (first_line, last_line)
+        self.schedule(self.refresh_dirty)
+
+    def schedule(self, callback):
+        if self.after_id is not None:
+            self.text_area.after_cancel(self.after_id)
+        self.after_id = self.text_area.after(self.DEBOUNCE, callback)
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.text_area.after_cancel(self.after_id)
+            self.after_id = None
+
+    def set_query(self, query, delay=True):
+        if delay and query == self.query:
+            return
+        self.query = query
+        self.pattern = re.compile(re.escape(query), re.IGNORECASE) if query else None
+        if delay:
+            self.schedule(self.search)
+        else:
+            self.cancel()
+            self.search()
+
+    def search(self):
+        self.after_id = None
+        self.dirty_lines = None
+        self.text_area.tag_remove(self.TAG, "1.0", tk.END)
+        self.text_area.tag_remove(self.CURRENT_TAG, "1.0", tk.END)
+        if self.pattern is not None:
+            self.tag_region(1, self.text_area.get("1.0", "end-1c"))
+        self.update_count()
+
+    def refresh_dirty(self):
+        self.after_id = None
+        if self.dirty_lines is None or self.pattern is None:
+            return
+        first_line, last_line = self.dirty_lines
+        self.dirty_lines = None
+        start, end = f"{first_line}.0", f"{last_line}.end"
+        self.text_area.tag_remove(self.TAG, start, end)
+        self.text_area.tag_remove(self.CURRENT_TAG, start, end)
+        self.tag_region(first_line, self.text_area.get(start, end))
+        self.update_count()
+
+    def tag_region(self, first_line, text):
+        # Character offsets are turned into line.column indices in Python, Tk never has to count
+        line_starts = [0]
+        position = text.find("\n")
+        while position != -1:
+            line_starts.append(position + 1)
+            position = text.find("\n", position + 1)
+
+        def to_index(offset):
+            line = bisect.bisect_right(line_starts, offset) - 1
+            return f"{first_line + line}.{offset - line_starts[line]}"
+
+        indices = []
+        for match in self.pattern.finditer(text):
+            if match.start() == match.end():
+                continue
+            indices.append(to_index(match.start()))
+            indices.append(to_index(match.end()))
+            if len(indices) >= 2 * self.TAG_BATCH:
+                self.text_area.tag_add(self.TAG, *indices)
+                indices = []
+        if indices:
+            self.text_area.tag_add(self.TAG, *indices)
+
+    def ranges(self):
+        ranges = self.text_area.tag_ranges(self.TAG)
+        return [(str(ranges[i]), str(ranges[i + 1])) for i in range(0, len(ranges), 2)]
+
+    def update_count(self, current=None):
+        if self.pattern is None:
+            self.count_label.config(text="")
+            return
+        total = len(self.text_area.tag_ranges(self.TAG)) // 2
+        if not total:
+            self.count_label.config(text="No results")
+        elif current is None:
+            self.count_label.config(text=f"{total} found")
+        else:
+            self.count_label.config(text=f"{current} of {total}")
+
+    def move(self, forward=True):
+        ranges = self.ranges()
+        if not ranges:
+            self.update_count()
+            return False
+        keys = [tuple(map(int, start.split("."))) for start, _ in ranges]
+        cursor = tuple(map(int, self.text_area.index(tk.INSERT).split(".")))
+        if forward:
+            match_no = bisect.bisect_right(keys, cursor) % len(ranges)
+        else:
+            match_no = (bisect.bisect_left(keys, cursor) - 1) % len(ranges)
+        start, end = ranges[match_no]
+        self.text_area.tag_remove(self.CURRENT_TAG, "1.0", tk.END)
+        self.text_area.tag_add(self.CURRENT_TAG, start, end)
+        self.text_area.mark_set(tk.INSERT, start)
+        self.text_area.see(start)
+        self.update_count(match_no + 1)
+        return True
+
+    def find_next(self):
+        return self.move(True)
+
+    def find_previous(self):
+        return self.move(False)
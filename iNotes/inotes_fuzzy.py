@@ -0,0 +1,128 @@
+GRAM_SIZE = 3
+GRAM_PADDING = "\0" * (GRAM_SIZE - 1)
+# Below this many candidates shipping them to other processes costs more than it saves
+PARALLEL_THRESHOLD = 20000
+PARALLEL_CHUNK = 5000
+
+def batch_distance(query, candidates, max_distance):
+    # Bit-parallel (Myers/Hyyro) distance of one query against many candidates. The query
+    # bit masks are built once; a candidate is dropped as soon as it cannot get back under the bound.
+    m = len(query)
+    if m == 0:
+        return [(candidate, len(candidate)) for candidate in candidates if len(candidate) <= max_distance]
+
+    peq = {}
+    for i, char in enumerate(query):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+
+    results = []
+    for candidate in candidates:
+        remaining = len(candidate)
+        if abs(remaining - m) > max_distance:
+            continue
+        pv, mv, score = mask, 0, m
+        for char in candidate:
+            eq = peq.get(char, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+            remaining -= 1
+            if score - remaining > max_distance:
+                break
+        else:
+            if score <= max_distance:
+                results.append((candidate, score))
+    return results
+
+def grams(word):
+    padded = f"{GRAM_PADDING}{word}{GRAM_PADDING}"
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+class FuzzyIndex:
+    def __init__(self, words=()):
+        self.words = set()
+        self.grams = {}
+        self.lengths = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if word in self.words:
+            return
+        self.words.add(word)
+        self.lengths.setdefault(len(word), set()).add(word)
+        for gram in grams(word):
+            self.grams.setdefault(gram, set()).add(word)
+
+    def remove(self, word):
+        if word not in self.words:
+            return
+        self.words.discard(word)
+        self.lengths[len(word)].discard(word)
+        for gram in grams(word):
+            words = self.grams.get(gram)
+            if words is not None:
+                words.discard(word)
+                if not words:
+                    del self.grams[gram]
+
+    def gram_words(self, query_grams):
+        # Words holding every one of the grams, no grams means every word
+        sets = sorted((self.grams.get(gram, set()) for gram in query_grams), key=len)
+        if not sets:
+            return set(self.words)
+        words = set(sets[0])
+        for other in sets[1:]:
+            words &= other
+            if not words:
+                break
+        return words
+
+    def with_prefix(self, prefix):
+        padded = f"{GRAM_PADDING}{prefix}"
+        return [word for word in self.gram_words({padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}) if word.startswith(prefix)]
+
+    def containing(self, fragment):
+        return [word for word in self.gram_words({fragment[i:i + GRAM_SIZE] for i in range(len(fragment) - GRAM_SIZE + 1)}) if fragment in word]
+
+    def candidates(self, query, max_distance):
+        # q-gram count filter: every edit destroys at most GRAM_SIZE of the query's distinct grams
+        query_grams = grams(query)
+        threshold = len(query_grams) - max_distance * GRAM_SIZE
+        length = len(query)
+        if threshold <= 0:
+            candidates = []
+            for size in range(max(0, length - max_distance), length + max_distance + 1):
+                candidates.extend(self.lengths.get(size, ()))
+            return candidates
+
+        counts = {}
+        for gram in query_grams:
+            for word in self.grams.get(gram, ()):
+                counts[word] = counts.get(word, 0) + 1
+        return [word for word, count in counts.items() if count >= threshold and abs(len(word) - length) <= max_distance]
+
+    def search(self, query, max_distance=1, executor=None):
+        if max_distance <= 0:
+            return [(query, 0)] if query in self.words else []
+        candidates = self.candidates(query, max_distance)
+        if executor is not None and len(candidates) > PARALLEL_THRESHOLD:
+            chunks = [candidates[i:i + PARALLEL_CHUNK] for i in range(0, len(candidates), PARALLEL_CHUNK)]
+            matches = []
+            for chunk_matches in executor.map(batch_distance, [query] * len(chunks), chunks, [max_distance] * len(chunks)):
+                matches.extend(chunk_matches)
+        else:
+            matches = batch_distance(query, candidates, max_distance)
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
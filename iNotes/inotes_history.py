@@ -0,0 +1,176 @@
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from inotes_autosave import atomic_write, content_hash
+
+class HistoryStore:
+    # Every saved version of a note is an object named by its content hash. An object is either a
+    # full keyframe or a line delta against the previous version; a keyframe is forced every
+    # KEYFRAME_INTERVAL versions so rebuilding a version never replays a long chain.
+    VERSION = 1
+    KEYFRAME_INTERVAL = 16
+    HEADER_SIZE = 40
+
+    def __init__(self, storage, folder_name="history"):
+        self.folder = storage.metadata_path(folder_name)
+        self.objects_folder = os.path.join(self.folder, "objects")
+        self.notes_folder = os.path.join(self.folder, "notes")
+        # note name -> (hash, lines) of its newest version, saves are deltas against it
+        self.latest = {}
+        self.lock = threading.RLock()
+
+    def manifest_path(self, name):
+        # Note names may hold characters that are not valid in file names
+        return os.path.join(self.notes_folder, f"{hashlib.blake2b(name.encode('utf-8'), digest_size=16).hexdigest()}.json")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_folder, digest[:2], digest)
+
+    def versions(self, name):
+        # Oldest first: [{"hash", "time", "size"}, ...]
+        path = self.manifest_path(name)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return []
+        if data.get("version") != self.VERSION:
+            return []
+        return data["versions"]
+
+    def save_versions(self, name, versions):
+        os.makedirs(self.notes_folder, exist_ok=True)
+        atomic_write(self.manifest_path(name), json.dumps({"version": self.VERSION, "name": name, "versions": versions}, separators=(",", ":")))
+
+    def read_header(self, digest):
+        # (kind, depth, base hash) without inflating the whole object
+        with open(self.object_path(digest), "rb") as file:
+            header = zlib.decompressobj().decompress(file.read(1024), self.HEADER_SIZE).decode("ascii")
+        kind, depth, base = header[0], int(header[1:5]), header[5:37]
+        return kind, depth, base or None
+
+    def read_object(self, digest):
+        with open(self.object_path(digest), "rb") as file:
+            data = zlib.decompress(file.read()).decode("utf-8")
+        kind, depth, base = data[0], int(data[1:5]), data[5:37]
+        body = data[self.HEADER_SIZE:]
+        if kind == "F":
+            return depth, None, body
+        return depth, base, json.loads(body)
+
+    def write_object(self, digest, kind, depth, base, body):
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = f"{kind}{depth:04d}{base or '':32}".ljust(self.HEADER_SIZE)
+        atomic_write(path, zlib.compress(f"{header}{body}".encode("utf-8")))
+
+    def lines(self, digest):
+        # Walk back to the keyframe, then replay the deltas forwards
+        deltas = []
+        while True:
+            depth, base, body = self.read_object(digest)
+            if base is None:
+                lines = body.splitlines(keepends=True)
+                break
+            deltas.append(body)
+            digest = base
+        for delta in reversed(deltas):
+            lines = apply_delta(lines, delta)
+        return lines
+
+    def content(self, digest):
+        with self.lock:
+            return "".join(self.lines(digest))
+
+    def record(self, name, content):
+        # Returns the new version entry, or None when the content equals the newest version
+        with self.lock:
+            versions = self.versions(name)
+            digest = content_hash(content)
+            if versions and versions[-1]["hash"] == digest:
+                return None
+
+            if not os.path.exists(self.object_path(digest)):
+                lines = content.splitlines(keepends=True)
+                depth = self.KEYFRAME_INTERVAL
+                if versions:
+                    base = versions[-1]["hash"]
+                    try:
+                        base_depth = self.read_header(base)[1]
+                        cached = self.latest.get(name)
+                        base_lines = cached[1] if cached and cached[0] == base else self.lines(base)
+                    except (OSError, ValueError, zlib.error):
+                        base_depth = self.KEYFRAME_INTERVAL
+                    depth = base_depth + 1
+                if depth < self.KEYFRAME_INTERVAL:
+                    self.write_object(digest, "D", depth, base, json.dumps(make_delta(base_lines, lines), separators=(",", ":")))
+                else:
+                    self.write_object(digest, "F", 0, None, content)
+                self.latest[name] = (digest, lines)
+            else:
+                # Same content as some earlier version, of this note or another one
+                self.latest.pop(name, None)
+
+            entry = {"hash": digest, "time": time.time(), "size": len(content)}
+            versions.append(entry)
+            self.save_versions(name, versions)
+            return entry
+
+    def version_content(self, name, version_no):
+        return self.content(self.versions(name)[version_no]["hash"])
+
+    def diff(self, name, version_no, content=None):
+        # Unified diff from a version to `content`, or to the version after it
+        versions = self.versions(name)
+        old_lines = self.lines(versions[version_no]["hash"])
+        if content is None:
+            new_lines = self.lines(versions[version_no + 1]["hash"]) if version_no + 1 < len(versions) else old_lines
+        else:
+            new_lines = content.splitlines(keepends=True)
+        return "".join(difflib.unified_diff(old_lines, new_lines, f"{name} (version {version_no + 1})", name))
+
+    def rename(self, old_name, new_name):
+        with self.lock:
+            old_path = self.manifest_path(old_name)
+            if not os.path.exists(old_path):
+                return
+            versions = self.versions(old_name)
+            self.save_versions(new_name, versions)
+            os.remove(old_path)
+            if old_name in self.latest:
+                self.latest[new_name] = self.latest.pop(old_name)
+
+    def delete(self, name):
+        # Objects may be shared with other notes and stay, only the list of versions goes
+        with self.lock:
+            self.latest.pop(name, None)
+            try:
+                os.remove(self.manifest_path(name))
+            except FileNotFoundError:
+                pass
+
+def make_delta(old_lines, new_lines):
+    # [first, last] copies lines of the old version, a string is inserted text
+    delta = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif j1 < j2:
+            delta.append("".join(new_lines[j1:j2]))
+    return delta
+
+def apply_delta(old_lines, delta):
+    lines = []
+    for op in delta:
+        if isinstance(op, str):
+            lines.extend(op.splitlines(keepends=True))
+        else:
+            lines.extend(old_lines[op[0]:op[1]])
+    return lines
@@ -0,0 +1,184 @@
+import json
+import os
+import re
+import threading
+from inotes_fuzzy import FuzzyIndex
+from inotes_stream import read_chunks
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def tokenize(content):
+    for position, match in enumerate(WORD_PATTERN.finditer(content)):
+        yield position, match.start(), match.group().lower()
+
+def tokenize_file(file):
+    # Same tokens as tokenize() but read piece by piece, so large notes are never held whole
+    position = 0
+    for base, text in read_chunks(file):
+        for match in WORD_PATTERN.finditer(text):
+            yield position, base + match.start(), match.group().lower()
+            position += 1
+
+class InvertedIndex:
+    VERSION = 1
+
+    def __init__(self, storage, file_name="index.json"):
+        self.storage = storage
+        self.index_path = storage.metadata_path(file_name)
+        # term -> {note name: [[word position, character offset], ...]}
+        self.postings = {}
+        # note name -> {"mtime": float, "length": int, "terms": [term, ...]}
+        self.notes = {}
+        self.total_length = 0
+        self.dirty = False
+        self.fuzzy = None
+        # Searches run on worker threads while saves update the index from the Tk thread
+        self.lock = threading.RLock()
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.VERSION:
+            return False
+        with self.lock:
+            self.postings = data["postings"]
+            self.notes = data["notes"]
+            self.total_length = sum(entry["length"] for entry in self.notes.values())
+            self.dirty = False
+            self.fuzzy = None
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.postings = {}
+            self.notes = {}
+            self.total_length = 0
+            self.dirty = True
+            self.fuzzy = None
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": self.VERSION, "notes": self.notes, "postings": self.postings}, file, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+            self.dirty = False
+
+    def refresh(self, entries, token=None, progress=None):
+        # Re-index only the notes whose mtime differs from the one recorded at index time
+        entries = dict(entries)
+        for note_no, (note_name, (mtime, size)) in enumerate(entries.items()):
+            if token is not None and token.cancelled:
+                return
+            if progress is not None and note_no % 100 == 0:
+                progress(note_no, len(entries))
+            entry = self.notes.get(note_name)
+            if entry and entry["mtime"] == mtime:
+                continue
+            try:
+                self.add_stored(note_name, mtime)
+            except OSError:
+                continue
+
+        with self.lock:
+            for note_name in [name for name in self.notes if name not in entries]:
+                self.remove_note(note_name)
+
+    def add_note(self, name, content, mtime=None):
+        self.add_tokens(name, tokenize(content), mtime)
+
+    def add_stored(self, name, mtime=None):
+        with self.storage.open_text(name) as file:
+            self.add_tokens(name, tokenize_file(file), mtime)
+
+    def add_tokens(self, name, tokens, mtime=None):
+        note_postings = {}
+        length = 0
+        for position, offset, term in tokens:
+            note_postings.setdefault(term, []).append([position, offset])
+            length += 1
+
+        with self.lock:
+            if name in self.notes:
+                self.remove_note(name)
+
+            for term, positions in note_postings.items():
+                term_postings = self.postings.get(term)
+                if term_postings is None:
+                    term_postings = self.postings[term] = {}
+                    if self.fuzzy is not None:
+                        self.fuzzy.add(term)
+                term_postings[name] = positions
+
+            self.notes[name] = {"mtime": mtime, "length": length, "terms": list(note_postings)}
+            self.total_length += length
+            self.dirty = True
+
+    def remove_note(self, name):
+        with self.lock:
+            entry = self.notes.pop(name, None)
+            if entry is None:
+                return
+            self.total_length -= entry["length"]
+            for term in entry["terms"]:
+                term_postings = self.postings.get(term)
+                if term_postings is None:
+                    continue
+                term_postings.pop(name, None)
+                if not term_postings:
+                    del self.postings[term]
+                    if self.fuzzy is not None:
+                        self.fuzzy.remove(term)
+            self.dirty = True
+
+    def rename_note(self, old_name, new_name):
+        with self.lock:
+            entry = self.notes.pop(old_name, None)
+            if entry is None:
+                return
+            if new_name in self.notes:
+                self.remove_note(new_name)
+            for term in entry["terms"]:
+                term_postings = self.postings[term]
+                term_postings[new_name] = term_postings.pop(old_name)
+            self.notes[new_name] = entry
+            self.dirty = True
+
+    def lookup(self, term):
+        return self.postings.get(term.lower(), {})
+
+    def note_count(self):
+        return len(self.notes)
+
+    def average_length(self):
+        return self.total_length / len(self.notes) if self.notes else 0
+
+    def note_length(self, name):
+        return self.notes[name]["length"]
+
+    def vocabulary(self):
+        # Trigram index over the terms, built on first use and then maintained by add_note/remove_note
+        with self.lock:
+            if self.fuzzy is None:
+                self.fuzzy = FuzzyIndex(self.postings)
+            return self.fuzzy
+
+    def fuzzy_lookup(self, term, max_distance, executor=None):
+        with self.lock:
+            return [(match, distance, self.postings[match]) for match, distance in self.vocabulary().search(term.lower(), max_distance, executor)]
+
+    def prefix_lookup(self, prefix):
+        with self.lock:
+            return [(term, self.postings[term]) for term in self.vocabulary().with_prefix(prefix.lower())]
+
+    def substring_lookup(self, fragment):
+        with self.lock:
+            return [(term, self.postings[term]) for term in self.vocabulary().containing(fragment.lower())]
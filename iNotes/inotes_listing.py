@@ -0,0 +1,94 @@
+import bisect
+from iNotes_classes import NoteCatalog
+from inotes_metrics import metrics
+
+# Each key ends with the note name so keys are unique and the name can be read back from them
+SORT_KEYS = {
+    "name": lambda name, mtime, size: (name.lower(), name),
+    "date": lambda name, mtime, size: (mtime, name),
+    "size": lambda name, mtime, size: (size, name),
+}
+
+class SortedListing:
+    def __init__(self, sort_key="date"):
+        self.catalog = NoteCatalog()
+        self.sort_key = sort_key
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, name):
+        return name in self.catalog
+
+    def make_key(self, name):
+        record = self.catalog.get(name)
+        return SORT_KEYS[self.sort_key](name, record.mtime, record.size)
+
+    @metrics.timed("sort")
+    def set_sort_key(self, sort_key):
+        if sort_key == self.sort_key and len(self.keys) == len(self.catalog):
+            return
+        self.sort_key = sort_key
+        self.keys = sorted(self.make_key(name) for name in self.catalog)
+
+    def load(self, entries):
+        self.catalog = NoteCatalog()
+        for name, (mtime, size) in entries.items():
+            self.catalog.update(name, mtime, size)
+        self.keys = sorted(self.make_key(name) for name in self.catalog)
+
+    def needs_rebuild(self, changed):
+        # Every insort moves the keys after it, past this many changes one sort is cheaper
+        return changed > len(self.keys) // 8 + 64
+
+    def sync(self, entries):
+        # Apply only the differences against a fresh scan instead of re-sorting everything
+        removed = [name for name in self.catalog if name not in entries]
+        changed = [name for name, (mtime, size) in entries.items() if not self.catalog.matches(name, mtime, size)]
+        if self.needs_rebuild(len(removed) + len(changed)):
+            self.load(entries)
+            return
+        for name in removed:
+            self.remove(name)
+        for name in changed:
+            self.update(name, *entries[name])
+
+    def replace(self, other):
+        # Swap in a listing sorted elsewhere, e.g. on a worker thread
+        self.catalog = other.catalog
+        self.sort_key = other.sort_key
+        self.keys = other.keys
+
+    def update(self, name, mtime, size):
+        if name in self.catalog:
+            if self.catalog.matches(name, mtime, size):
+                return
+            self.remove(name)
+        self.catalog.update(name, mtime, size)
+        bisect.insort(self.keys, self.make_key(name))
+
+    def remove(self, name):
+        if name not in self.catalog:
+            return
+        key = self.make_key(name)
+        del self.keys[bisect.bisect_left(self.keys, key)]
+        self.catalog.remove(name)
+
+    def rename(self, old_name, new_name):
+        record = self.catalog.get(old_name)
+        if record is None:
+            return
+        mtime, size = record.mtime, record.size
+        self.remove(old_name)
+        self.update(new_name, mtime, size)
+
+    def name_at(self, row, descending=False):
+        # Descending order is read from the other end, nothing is re-sorted
+        if descending:
+            row = len(self.keys) - 1 - row
+        return self.keys[row][-1]
+
+    def row(self, row, descending=False):
+        record = self.catalog.get(self.name_at(row, descending))
+        return record.name, record.mtime, record.size
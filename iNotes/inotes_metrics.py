@@ -0,0 +1,222 @@
+import collections
+import functools
+import io
+import json
+import os
+import threading
+import time
+
+# Configured from the environment when the module is imported:
+#   INOTES_METRICS=1               turn spans and counters on
+#   INOTES_METRICS_FILE=path       append every finished span to a JSON lines file
+#   INOTES_METRICS_PORT=8765       serve a snapshot as JSON on http://127.0.0.1:<port>/ (see serve())
+#   INOTES_PROFILE=save_note,scan  run these spans (or * for all) under cProfile and tracemalloc
+#   INOTES_PROFILE_DIR=path        where the .prof files go, default ./inotes-profiles
+RECENT_SAMPLES = 1024
+
+class NullSpan:
+    # Shared by every span while metrics are off, entering it does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("metrics", "name", "start", "profiler", "traced")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.profiler = None
+        self.traced = False
+
+    def __enter__(self):
+        if self.metrics.should_profile(self.name):
+            import cProfile
+            import tracemalloc
+            self.profiler = cProfile.Profile()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.traced = True
+            tracemalloc.reset_peak()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        record = {"span": self.name, "ms": round(elapsed * 1000, 3), "time": time.time(), "thread": threading.current_thread().name}
+        if self.profiler is not None:
+            import tracemalloc
+            self.profiler.disable()
+            record["peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            if self.traced:
+                tracemalloc.stop()
+            record["profile"] = self.metrics.dump_profile(self.name, self.profiler)
+        self.metrics.finish_span(self.name, elapsed, record)
+        return False
+
+class Metrics:
+    def __init__(self, enabled=False, export_path=None, profile=(), profile_folder="inotes-profiles"):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.profile = set(profile)
+        self.profile_folder = profile_folder
+        self.profiling = False
+        self.counters = collections.Counter()
+        # span name -> [count, total seconds, max seconds, recent durations]
+        self.spans = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    @classmethod
+    def from_environment(cls):
+        profile = [name for name in os.environ.get("INOTES_PROFILE", "").split(",") if name]
+        return cls(
+            enabled=bool(os.environ.get("INOTES_METRICS")) or bool(profile),
+            export_path=os.environ.get("INOTES_METRICS_FILE"),
+            profile=profile,
+            profile_folder=os.environ.get("INOTES_PROFILE_DIR", "inotes-profiles"),
+        )
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def timed(self, name):
+        # Decorator form of span(); with metrics off the function is returned untouched
+        def decorate(function):
+            if not self.enabled:
+                return function
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with Span(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reader(self, raw):
+        # Counts the bytes pulled through a raw binary stream
+        if not self.enabled:
+            return raw
+        self.count("files_read")
+        return CountingReader(self, raw)
+
+    def should_profile(self, name):
+        if not self.profile or not (name in self.profile or "*" in self.profile):
+            return False
+        # Only one profiler can be active at a time, nested or concurrent spans are only timed
+        with self.lock:
+            if self.profiling:
+                return False
+            self.profiling = True
+            return True
+
+    def dump_profile(self, name, profiler):
+        os.makedirs(self.profile_folder, exist_ok=True)
+        path = os.path.join(self.profile_folder, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 1000000}.prof")
+        profiler.dump_stats(path)
+        with self.lock:
+            self.profiling = False
+        return path
+
+    def finish_span(self, name, elapsed, record):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = [0, 0.0, 0.0, collections.deque(maxlen=RECENT_SAMPLES)]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3].append(elapsed)
+            if self.export_path:
+                with open(self.export_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        with self.lock:
+            spans = {}
+            for name, (count, total, longest, recent) in self.spans.items():
+                ordered = sorted(recent)
+                spans[name] = {
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total * 1000 / count, 3),
+                    "max_ms": round(longest * 1000, 3),
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                    "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+                }
+            return {"counters": dict(self.counters), "spans": spans}
+
+    def export_snapshot(self):
+        if self.enabled and self.export_path:
+            with open(self.export_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps({"snapshot": self.snapshot(), "time": time.time()}) + "\n")
+
+    def serve(self, port):
+        # Local only, GET / returns the snapshot. http.server is slow to import, so only here.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class StatsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot(), indent=2).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), StatsHandler)
+        threading.Thread(target=self.server.serve_forever, name="inotes-stats", daemon=True).start()
+        return self.server.server_address
+
+    def close(self):
+        self.export_snapshot()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+class CountingReader(io.RawIOBase):
+    def __init__(self, metrics, raw):
+        self.metrics = metrics
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def readinto(self, buffer):
+        size = self.raw.readinto(buffer)
+        if size:
+            self.metrics.count("bytes_read", size)
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+metrics = Metrics.from_environment()
@@ -0,0 +1,356 @@
+import re
+from inotes_fuzzy import GRAM_SIZE
+from inotes_index import WORD_PATTERN
+from inotes_search import SearchResult, note_snippet
+from inotes_stream import stream_matches
+
+# Query syntax, case-insensitive throughout:
+#   kiwi pear            both words (AND is implied between terms)
+#   kiwi OR pear         either word
+#   NOT kiwi, -kiwi      notes without the word
+#   "ripe green kiwi"    the words next to each other, in this order
+#   kiw*                 any word starting with kiw
+#   /ki+wi\s+\d+/        a regular expression over the note text
+#   (kiwi OR pear) -plum parentheses group
+TOKEN_PATTERN = re.compile(r'\s*(?:(?P<phrase>"[^"]*"?)|(?P<regex>/(?:\\.|[^/\\])+/)|(?P<open>\()|(?P<close>\))|(?P<word>[^\s()"]+))')
+OPERATORS = ("AND", "OR", "NOT")
+# Matches of a regex longer than this may be missed where the note is read in two pieces
+REGEX_OVERLAP = 4096
+
+class QueryError(ValueError):
+    pass
+
+def tokenize_query(query):
+    # [(kind, text), ...] with kind one of phrase, regex, open, close and word
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match is None or match.end() == position:
+            break
+        position = match.end()
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+    return tokens
+
+def is_structured(query):
+    # Plain words keep going through the ranked, typo tolerant search
+    for kind, text in tokenize_query(query):
+        if kind != "word":
+            return True
+        if text in OPERATORS or text.endswith("*") or (text.startswith("-") and len(text) > 1):
+            return True
+    return False
+
+# Hex digits after \x, \u and \U
+ESCAPE_DIGITS = {"x": 2, "u": 4, "U": 8}
+
+def escape_end(source, position):
+    # Index just past the escape sequence that starts with the backslash at `position`
+    kind = source[position + 1:position + 2]
+    if kind in ESCAPE_DIGITS:
+        return position + 2 + ESCAPE_DIGITS[kind]
+    if kind == "N" and source[position + 2:position + 3] == "{":
+        end = source.find("}", position)
+        return len(source) if end < 0 else end + 1
+    if kind.isdigit():
+        # Octal escape or group reference, at most three digits
+        end = position + 1
+        while end < len(source) and end < position + 4 and source[end].isdigit():
+            end += 1
+        return end
+    return position + 2
+
+def required_literals(source):
+    # Runs of word characters that every match of the regex contains. Only plain text outside any
+    # group, class or repetition counts, and a top-level alternation means nothing is required.
+    runs = []
+    run = ""
+    depth = 0
+    position = 0
+    while position < len(source):
+        char = source[position]
+        if char == "\\":
+            # Nothing in an escape counts as a literal, and it ends the run
+            position = escape_end(source, position) - 1
+        elif char == "[":
+            position += 1
+            if position < len(source) and source[position] == "^":
+                position += 1
+            if position < len(source) and source[position] == "]":
+                position += 1
+            while position < len(source) and source[position] != "]":
+                position += 2 if source[position] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return []
+        elif char in "?*{":
+            # The character before may occur zero times
+            run = run[:-1]
+            if char == "{":
+                position = source.find("}", position)
+                if position < 0:
+                    break
+        elif depth == 0 and char != "+" and WORD_PATTERN.fullmatch(char):
+            run += char
+            position += 1
+            continue
+        elif char == "+":
+            # At least once: the run ends here, but the repeated character still starts the next one
+            if run:
+                runs.append(run)
+            run = run[-1:]
+            position += 1
+            continue
+        if run:
+            runs.append(run)
+        run = ""
+        position += 1
+    if run:
+        runs.append(run)
+    return runs
+
+class QueryParser:
+    def __init__(self, query):
+        self.tokens = tokenize_query(query)
+        self.position = 0
+
+    def parse(self):
+        # Nested tuples: ("and" | "or", [nodes]), ("not", node), ("term", term), ("prefix", prefix),
+        # ("phrase", [terms]) and ("regex", compiled pattern). None for a query without any terms.
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == ("word", "OR"):
+            self.position += 1
+            nodes.append(self.parse_and())
+        nodes = [node for node in nodes if node is not None]
+        if len(nodes) < 2:
+            return nodes[0] if nodes else None
+        return ("or", nodes)
+
+    def parse_and(self):
+        nodes = []
+        while True:
+            kind, text = self.peek()
+            if kind is None or kind == "close" or text == "OR":
+                break
+            if text == "AND":
+                self.position += 1
+                continue
+            node = self.parse_not()
+            if node is not None:
+                nodes.append(node)
+        if len(nodes) < 2:
+            return nodes[0] if nodes else None
+        return ("and", nodes)
+
+    def parse_not(self):
+        kind, text = self.peek()
+        if text == "NOT":
+            self.position += 1
+            node = self.parse_not()
+            return ("not", node) if node is not None else None
+        if kind == "word" and text.startswith("-") and len(text) > 1:
+            self.tokens[self.position] = ("word", text[1:])
+            node = self.parse_not()
+            return ("not", node) if node is not None else None
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, text = self.peek()
+        if kind is None or kind == "close":
+            return None
+        self.position += 1
+        if kind == "open":
+            node = self.parse_or()
+            if self.peek()[0] == "close":
+                self.position += 1
+            return node
+        if kind == "regex":
+            try:
+                return ("regex", re.compile(text[1:-1], re.IGNORECASE))
+            except re.error as error:
+                raise QueryError(f"Invalid regex {text}: {error}")
+        if kind == "phrase":
+            text = text.strip('"')
+        elif text.endswith("*"):
+            prefix = text.rstrip("*").lower()
+            return ("prefix", prefix) if WORD_PATTERN.fullmatch(prefix) else None
+        terms = [match.group().lower() for match in WORD_PATTERN.finditer(text)]
+        if not terms:
+            return None
+        # A word with punctuation inside, like e-mail, is a phrase of its parts
+        return ("term", terms[0]) if len(terms) == 1 else ("phrase", terms)
+
+class QueryEngine:
+    # Boolean, phrase, prefix and regex queries answered from the positional postings. Only regexes
+    # read notes, and only the ones the trigram index over the terms can not rule out.
+    VERIFY_BATCH = 64
+
+    def __init__(self, index, storage):
+        self.index = index
+        self.storage = storage
+
+    def parse(self, query):
+        return QueryParser(query).parse()
+
+    def evaluate(self, node):
+        # {note name: hit or None} and whether that is exact. Regexes, and NOT over a regex, only
+        # narrow the notes down; those are checked against the text by verify().
+        kind = node[0]
+        if kind == "term":
+            return {name: (positions[0][1], len(node[1]), None) for name, positions in self.index.lookup(node[1]).items()}, True
+        if kind == "prefix":
+            hits = {}
+            for term, notes in self.index.prefix_lookup(node[1]):
+                for name, positions in notes.items():
+                    if name not in hits or positions[0][1] < hits[name][0]:
+                        hits[name] = (positions[0][1], len(term), None)
+            return hits, True
+        if kind == "phrase":
+            return self.phrase_hits(node[1]), True
+        if kind == "regex":
+            return dict.fromkeys(self.regex_candidates(node[1])), False
+        if kind == "not":
+            hits, exact = self.evaluate(node[1])
+            if not exact:
+                return dict.fromkeys(self.index.notes), False
+            return {name: None for name in self.index.notes if name not in hits}, True
+        results = [self.evaluate(child) for child in node[1]]
+        exact = all(child_exact for _, child_exact in results)
+        if kind == "and":
+            results.sort(key=lambda result: len(result[0]))
+            hits = dict(results[0][0])
+            for child_hits, _ in results[1:]:
+                hits = {name: hit if hit is not None else child_hits[name] for name, hit in hits.items() if name in child_hits}
+            return hits, exact
+        hits = {}
+        for child_hits, _ in results:
+            for name, hit in child_hits.items():
+                if hits.get(name) is None:
+                    hits[name] = hit
+        return hits, exact
+
+    def phrase_hits(self, terms):
+        postings = [self.index.lookup(term) for term in terms]
+        if not all(postings):
+            return {}
+        names = set(min(postings, key=len))
+        for notes in postings:
+            names.intersection_update(notes)
+        hits = {}
+        for name in names:
+            # Position -> offset of every later term, the phrase starts where they all line up
+            later = [{position: offset for position, offset in notes[name]} for notes in postings[1:]]
+            for position, offset in postings[0][name]:
+                if all(position + step in positions for step, positions in enumerate(later, 1)):
+                    end = later[-1][position + len(later)] + len(terms[-1]) if later else offset + len(terms[0])
+                    hits[name] = (offset, end - offset, None)
+                    break
+        return hits
+
+    def regex_candidates(self, pattern):
+        # Every note a match could be in: those holding a term that contains each literal of the regex
+        if pattern.flags & re.VERBOSE:
+            return set(self.index.notes)
+        candidates = None
+        for literal in sorted(required_literals(pattern.pattern), key=len, reverse=True):
+            if len(literal) < GRAM_SIZE:
+                continue
+            notes = set()
+            for term, term_notes in self.index.substring_lookup(literal):
+                notes.update(term_notes)
+            candidates = notes if candidates is None else candidates & notes
+            if not candidates:
+                break
+        return set(self.index.notes) if candidates is None else candidates
+
+    def verify(self, node, name, matches):
+        # (matched, hit) of one note, reading it only for regexes
+        kind = node[0]
+        if kind == "regex":
+            key = (id(node), name)
+            if key not in matches:
+                matches[key] = self.regex_hit(node[1], name)
+            hit = matches[key]
+            return hit is not None, hit
+        if kind == "not":
+            matched, _ = self.verify(node[1], name, matches)
+            return not matched, None
+        if kind in ("and", "or"):
+            found = None
+            for child in node[1]:
+                matched, hit = self.verify(child, name, matches)
+                if matched and found is None:
+                    found = hit
+                if kind == "and" and not matched:
+                    return False, None
+                if kind == "or" and matched:
+                    return True, hit
+            return kind == "and", found
+        hits = matches.get(id(node))
+        if hits is None:
+            with self.index.lock:
+                hits = matches[id(node)] = self.evaluate(node)[0]
+        return name in hits, hits.get(name)
+
+    def regex_hit(self, pattern, name):
+        try:
+            with self.storage.open_text(name) as file:
+                for offset, text, snippet in stream_matches(file, pattern, limit=1, overlap=REGEX_OVERLAP):
+                    return offset, len(text), snippet
+        except OSError:
+            pass
+        return None
+
+    def iter_batches(self, query, limit=10, token=None, batch_size=5):
+        # Lists of SearchResult, newest notes first. A batch is handed out as soon as it is full,
+        # or whenever notes had to be read to check a regex, so the first hits show up early.
+        node = self.parse(query)
+        if node is None:
+            return
+        with self.index.lock:
+            hits, exact = self.evaluate(node)
+            mtimes = {name: self.index.notes[name]["mtime"] for name in hits if name in self.index.notes}
+        names = sorted(mtimes, key=lambda name: (-(mtimes[name] or 0), name))
+
+        batch = []
+        found = 0
+        # Notes read for a regex since the last batch went out
+        scanned = 0
+        matches = {}
+        for name in names:
+            if token is not None and token.cancelled:
+                return
+            # The first hit goes out alone, the rest once a batch fills up or reading takes a while
+            if batch and (found == len(batch) or len(batch) >= batch_size or scanned >= self.VERIFY_BATCH):
+                yield batch
+                batch = []
+                scanned = 0
+            hit = hits[name]
+            if not exact:
+                scanned += 1
+                matched, verified_hit = self.verify(node, name, matches)
+                if not matched:
+                    continue
+                hit = hit or verified_hit
+            offset, length, snippet = hit if hit is not None else (0, 0, None)
+            if snippet is None:
+                snippet = note_snippet(self.storage, name, offset, length)
+            batch.append(SearchResult(name, 0.0, query, offset, snippet, length))
+            found += 1
+            if found >= limit:
+                break
+        if batch:
+            yield batch
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+
+# App metadata lives in a subfolder so writing it never bumps the notes folder mtime
+METADATA_FOLDER = ".inotes"
+
+def metadata_path(folder, file_name):
+    return os.path.join(folder, METADATA_FOLDER, file_name)
+
+class DirectoryCache:
+    VERSION = 1
+
+    def __init__(self, folder, suffixes=(".txt",), file_name="listing.json"):
+        self.folder = folder
+        self.suffixes = suffixes
+        self.cache_path = metadata_path(folder, file_name)
+        self.dir_mtime = None
+        # note name -> (mtime, size)
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def load(self):
+        # Create the metadata folder up front so it does not invalidate the first scan later
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.VERSION:
+            return False
+        self.dir_mtime = data["dir_mtime"]
+        self.entries = {name: tuple(entry) for name, entry in data["entries"].items()}
+        self.dirty = False
+        return True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": self.VERSION, "dir_mtime": self.dir_mtime, "entries": self.entries}, file, separators=(",", ":"))
+            os.replace(temp_path, self.cache_path)
+            self.dirty = False
+
+    def folder_mtime(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def scan(self):
+        # An unchanged directory mtime means no note was added, removed or renamed: reuse the cache
+        with self.lock:
+            dir_mtime = self.folder_mtime()
+            if dir_mtime is not None and dir_mtime == self.dir_mtime:
+                return dict(self.entries)
+
+            entries = {}
+            if dir_mtime is not None:
+                with os.scandir(self.folder) as iterator:
+                    for entry in iterator:
+                        suffix = next((suffix for suffix in self.suffixes if entry.name.endswith(suffix)), None)
+                        if suffix is None:
+                            continue
+                        try:
+                            if not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        name = entry.name[:-len(suffix)]
+                        # A note stored under two suffixes counts once, as its newest file
+                        if name not in entries or entries[name][0] < stat.st_mtime:
+                            entries[name] = (stat.st_mtime, stat.st_size)
+
+            if entries != self.entries or dir_mtime != self.dir_mtime:
+                self.dirty = True
+            self.entries = entries
+            self.dir_mtime = dir_mtime
+            # A copy, the live dict keeps changing under note_changed while callers iterate
+            return dict(entries)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.entries)
+
+    def revalidate(self, name):
+        # Per-entry check for content edited in place, which does not touch the directory mtime.
+        # Other programs may have changed the folder too, so the directory mtime stays as it is.
+        entry = None
+        for suffix in self.suffixes:
+            try:
+                stat = os.stat(os.path.join(self.folder, f"{name}{suffix}"))
+            except OSError:
+                continue
+            if entry is None or entry[0] < stat.st_mtime:
+                entry = (stat.st_mtime, stat.st_size)
+        if entry is None:
+            self.note_removed(name)
+            return None
+        if self.entries.get(name) != entry:
+            self.note_changed(name, *entry)
+        return entry
+
+    def sync_dir_mtime(self, before):
+        # Changes made by the app itself are applied directly, so the next scan can stay cached.
+        # `before` is the folder mtime from just before the change; when the cache was already
+        # behind it another program changed the folder too, and the next scan has to list it.
+        with self.lock:
+            if before is None or before != self.dir_mtime:
+                return
+            self.dir_mtime = self.folder_mtime()
+            if self.dir_mtime != before:
+                self.dirty = True
+
+    def note_changed(self, name, mtime, size, before=None):
+        with self.lock:
+            self.entries[name] = (mtime, size)
+            self.sync_dir_mtime(before)
+            self.dirty = True
+
+    def note_removed(self, name, before=None):
+        with self.lock:
+            if self.entries.pop(name, None) is not None:
+                self.dirty = True
+            self.sync_dir_mtime(before)
+
+    def note_renamed(self, old_name, new_name, before=None):
+        with self.lock:
+            entry = self.entries.pop(old_name, None)
+            if entry is not None:
+                self.entries[new_name] = entry
+                self.dirty = True
+            self.sync_dir_mtime(before)
@@ -0,0 +1,73 @@
+import heapq
+import math
+from inotes_index import WORD_PATTERN
+from inotes_stream import read_snippet
+
+class SearchResult:
+    __slots__ = ("name", "score", "term", "offset", "length", "snippet")
+
+    def __init__(self, name, score, term, offset, snippet, length=None):
+        self.name = name
+        self.score = score
+        self.term = term
+        self.offset = offset
+        # Characters to highlight from offset, a phrase hit spans more than its first term
+        self.length = len(term) if length is None else length
+        self.snippet = snippet
+
+def note_snippet(storage, name, offset, length):
+    try:
+        with storage.open_text(name) as file:
+            return read_snippet(file, offset, length)
+    except OSError:
+        return ""
+
+class SearchEngine:
+    # Okapi BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, index, storage, executor=None):
+        self.index = index
+        self.storage = storage
+        self.executor = executor
+
+    def iter_search(self, query, k=10, max_distance=1):
+        # Scores everything up front, then yields the top k one by one as their snippets are read
+        terms = [match.group().lower() for match in WORD_PATTERN.finditer(query)]
+        if not terms:
+            return
+
+        with self.index.lock:
+            note_count = self.index.note_count()
+            average_length = self.index.average_length() or 1
+            scores = {}
+            best_hits = {}
+            for term in dict.fromkeys(terms):
+                for word, distance, notes in self.index.fuzzy_lookup(term, max_distance, self.executor):
+                    # Typo matches count for less than exact ones
+                    weight = 1.0 / (1 + distance)
+                    idf = math.log(1 + (note_count - len(notes) + 0.5) / (len(notes) + 0.5))
+                    for name, positions in notes.items():
+                        frequency = len(positions)
+                        norm = self.K1 * (1 - self.B + self.B * self.index.note_length(name) / average_length)
+                        score = weight * idf * frequency * (self.K1 + 1) / (frequency + norm)
+                        scores[name] = scores.get(name, 0.0) + score
+                        # The hit shown is the closest spelling, a rare typo must not win over the word itself
+                        hit = (distance, -score)
+                        best = best_hits.get(name)
+                        if best is None or hit < best[0]:
+                            best_hits[name] = (hit, word, positions[0][1])
+
+            # Bounded min-heap keeps only the k best notes
+            heap = []
+            for name, score in scores.items():
+                entry = (score, name)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        for score, name in sorted(heap, key=lambda entry: (-entry[0], entry[1])):
+            _, word, offset = best_hits[name]
+            yield SearchResult(name, score, word, offset, note_snippet(self.storage, name, offset, len(word)))
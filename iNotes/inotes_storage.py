@@ -0,0 +1,424 @@
+import io
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from inotes_autosave import atomic_write
+from inotes_blocks import compress_blocks, is_compressed, open_blocks, BlockReader
+from inotes_index import WORD_PATTERN
+from inotes_metrics import metrics
+from inotes_scan import DirectoryCache, metadata_path
+from inotes_stream import read_chunks
+from inotes_watch import watch_folder
+
+def count_words(file):
+    return sum(len(WORD_PATTERN.findall(text)) for _, text in read_chunks(file))
+
+class NoteStorage(ABC):
+    @abstractmethod
+    def metadata_path(self, file_name):
+        pass
+
+    @abstractmethod
+    def cached_notes(self):
+        # Last known {name: (mtime, size)} without touching the disk if possible
+        pass
+
+    @abstractmethod
+    def list_notes(self):
+        pass
+
+    @abstractmethod
+    def revalidate(self, name):
+        # Fresh (mtime, size) of one note, None when it does not exist
+        pass
+
+    @abstractmethod
+    def exists(self, name):
+        pass
+
+    @abstractmethod
+    def open_text(self, name):
+        pass
+
+    @abstractmethod
+    def write(self, name, content):
+        pass
+
+    @abstractmethod
+    def rename(self, old_name, new_name):
+        # Never overwrites: FileExistsError when another note already has the new name
+        pass
+
+    @abstractmethod
+    def delete(self, name):
+        pass
+
+    def read(self, name):
+        with self.open_text(name) as file:
+            return file.read()
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    # Whether write() may be called from several threads at once
+    concurrent_writes = False
+
+    def watch(self, use_inotify=True):
+        # A started FolderWatcher for changes made by other programs, None when there is nothing to watch
+        return None
+
+    def note_name(self, file_name):
+        # Note stored in a file reported by the watcher, None for files that are not notes
+        return None
+
+    def close(self):
+        pass
+
+class FolderStorage(NoteStorage):
+    # One <name>.txt per note, the layout iNotes has always used. With a compress_threshold, notes
+    # of at least that many bytes are kept block-compressed as <name>.txt.z instead.
+    SUFFIX = ".txt"
+    COMPRESSED_SUFFIX = ".txt.z"
+    METADATA_INTERVAL = 30
+    concurrent_writes = True
+
+    def __init__(self, folder, compress_threshold=None):
+        self.folder = folder
+        self.compress_threshold = compress_threshold
+        self.cache = DirectoryCache(folder, (self.SUFFIX, self.COMPRESSED_SUFFIX))
+        # Sidecar of compressed notes: name -> [mtime, uncompressed size, word count or None], so
+        # listing them never inflates anything
+        self.sidecar_path = metadata_path(folder, "compressed.json")
+        self.compressed = {}
+        self.sidecar_dirty = False
+        self.lock = threading.RLock()
+        self.loaded = False
+        # Inside a transaction the listing cache and sidecar are written once, when it ends
+        self.batch_depth = 0
+        self.metadata_saved = time.monotonic()
+
+    def load(self):
+        # The persisted listing grows with the number of notes, so it is read on first use rather
+        # than while the window is being built
+        with self.lock:
+            if not self.loaded:
+                self.cache.load()
+                self.load_sidecar()
+                self.loaded = True
+
+    def load_sidecar(self):
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as file:
+                self.compressed = json.load(file)
+        except (OSError, ValueError):
+            self.compressed = {}
+
+    def save_metadata(self):
+        with self.lock:
+            if self.batch_depth:
+                return
+            self.cache.save()
+            if self.sidecar_dirty:
+                atomic_write(self.sidecar_path, json.dumps(self.compressed, separators=(",", ":")))
+                self.sidecar_dirty = False
+            self.metadata_saved = time.monotonic()
+
+    def metadata_changed(self):
+        # Rewriting listing.json after every save would cost more than the save itself, so writes,
+        # renames and deletes persist it at most every METADATA_INTERVAL seconds and on close.
+        # After a crash the folder mtime no longer matches listing.json, so the next scan lists the
+        # folder again; stale sidecar entries are re-read when their mtime no longer matches.
+        if time.monotonic() - self.metadata_saved >= self.METADATA_INTERVAL:
+            self.save_metadata()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                self.save_metadata()
+
+    def path_for(self, name, suffix=SUFFIX):
+        return os.path.join(self.folder, f"{name}{suffix}")
+
+    def current_path(self, name):
+        compressed_path = self.path_for(name, self.COMPRESSED_SUFFIX)
+        if (name in self.compressed or not os.path.exists(self.path_for(name))) and os.path.exists(compressed_path):
+            return compressed_path
+        return self.path_for(name)
+
+    def metadata_path(self, file_name):
+        return metadata_path(self.folder, file_name)
+
+    def note_entry(self, name, entry):
+        # The cache holds sizes on disk, compressed notes are listed with their real size
+        info = self.compressed.get(name)
+        if info is None or entry is None:
+            return entry
+        if info[0] != entry[0]:
+            # Replaced by another program since the sidecar was written
+            try:
+                info = self.describe(name)
+            except (OSError, ValueError):
+                return entry
+        return entry[0], info[1]
+
+    def describe(self, name):
+        # The real size comes from the block trailer, listing never inflates a note. The word
+        # count of a note another program wrote is unknown (None) until the app saves it again.
+        with self.lock:
+            file_path = self.path_for(name, self.COMPRESSED_SUFFIX)
+            with open(file_path, "rb") as file:
+                mtime = os.fstat(file.fileno()).st_mtime
+                if not is_compressed(file):
+                    raise ValueError(f"{file_path} is not block-compressed")
+                size = BlockReader(file).size
+            self.compressed[name] = [mtime, size, None]
+            # Written with the listing cache by metadata_changed() or close()
+            self.sidecar_dirty = True
+            return self.compressed[name]
+
+    def with_sizes(self, entries):
+        if not self.compressed:
+            return entries
+        return {name: self.note_entry(name, entry) for name, entry in entries.items()}
+
+    def cached_notes(self):
+        self.load()
+        return self.with_sizes(self.cache.snapshot())
+
+    def list_notes(self):
+        self.load()
+        entries = self.cache.scan()
+        self.save_metadata()
+        return self.with_sizes(entries)
+
+    def revalidate(self, name):
+        self.load()
+        entry = self.cache.revalidate(name)
+        self.metadata_changed()
+        return self.note_entry(name, entry)
+
+    def watch(self, use_inotify=True):
+        return watch_folder(self.folder, (self.SUFFIX, self.COMPRESSED_SUFFIX), use_inotify)
+
+    def note_name(self, file_name):
+        for suffix in (self.SUFFIX, self.COMPRESSED_SUFFIX):
+            if file_name.endswith(suffix):
+                return file_name[:-len(suffix)]
+        return None
+
+    def exists(self, name):
+        return os.path.exists(self.path_for(name)) or os.path.exists(self.path_for(name, self.COMPRESSED_SUFFIX))
+
+    def open_text(self, name):
+        self.load()
+        file = metrics.reader(open(self.current_path(name), "rb", buffering=0))
+        if is_compressed(file):
+            return open_blocks(file)
+        return io.TextIOWrapper(io.BufferedReader(file), encoding="utf-8", errors="replace")
+
+    def write(self, name, content):
+        self.load()
+        before = self.cache.folder_mtime()
+        data = content.encode("utf-8")
+        compress = self.compress_threshold is not None and len(data) >= self.compress_threshold
+        suffix, stale_suffix = (self.COMPRESSED_SUFFIX, self.SUFFIX) if compress else (self.SUFFIX, self.COMPRESSED_SUFFIX)
+        file_path = self.path_for(name, suffix)
+        atomic_write(file_path, compress_blocks(data) if compress else content)
+        stale_path = self.path_for(name, stale_suffix)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+        stat = os.stat(file_path)
+        self.cache.note_changed(name, stat.st_mtime, stat.st_size, before)
+        with self.lock:
+            if compress:
+                self.compressed[name] = [stat.st_mtime, len(data), count_words(io.StringIO(content))]
+                self.sidecar_dirty = True
+            elif self.compressed.pop(name, None) is not None:
+                self.sidecar_dirty = True
+        self.metadata_changed()
+        return stat.st_mtime, len(data)
+
+    def rename(self, old_name, new_name):
+        self.load()
+        before = self.cache.folder_mtime()
+        suffixes = [suffix for suffix in (self.SUFFIX, self.COMPRESSED_SUFFIX) if os.path.exists(self.path_for(old_name, suffix))]
+        if not suffixes:
+            raise FileNotFoundError(self.path_for(old_name))
+        for suffix in (self.SUFFIX, self.COMPRESSED_SUFFIX):
+            target = self.path_for(new_name, suffix)
+            # On a case-insensitive file system a new case of the same name is the same file
+            if os.path.exists(target) and not (suffix in suffixes and os.path.samefile(self.path_for(old_name, suffix), target)):
+                raise FileExistsError(target)
+        for suffix in suffixes:
+            os.rename(self.path_for(old_name, suffix), self.path_for(new_name, suffix))
+        self.cache.note_renamed(old_name, new_name, before)
+        with self.lock:
+            info = self.compressed.pop(old_name, None)
+            if self.compressed.pop(new_name, None) is not None or info is not None:
+                self.sidecar_dirty = True
+            if info is not None:
+                self.compressed[new_name] = info
+        self.metadata_changed()
+
+    def delete(self, name):
+        self.load()
+        before = self.cache.folder_mtime()
+        removed = False
+        for suffix in (self.SUFFIX, self.COMPRESSED_SUFFIX):
+            if os.path.exists(self.path_for(name, suffix)):
+                os.remove(self.path_for(name, suffix))
+                removed = True
+        if not removed:
+            raise FileNotFoundError(self.path_for(name))
+        self.cache.note_removed(name, before)
+        with self.lock:
+            if self.compressed.pop(name, None) is not None:
+                self.sidecar_dirty = True
+        self.metadata_changed()
+
+    def close(self):
+        self.save_metadata()
+
+class BlobReader(io.RawIOBase):
+    # Lets io.TextIOWrapper stream a SQLite blob without copying it into memory
+    def __init__(self, blob):
+        self.blob = blob
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.blob.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.blob.seek(offset, whence)
+        return self.blob.tell()
+
+    def tell(self):
+        return self.blob.tell()
+
+    def close(self):
+        if not self.closed:
+            self.blob.close()
+        super().close()
+
+class PackedStorage(NoteStorage):
+    # Every note in one SQLite file: indexed lookups by name, metadata listing without reading
+    # content and transactional batches of writes, renames and deletes
+    def __init__(self, db_path, compress_threshold=None):
+        self.db_path = db_path
+        # Notes of at least this many bytes are stored block-compressed
+        self.compress_threshold = compress_threshold
+        self.local = threading.local()
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS notes (name TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, content BLOB NOT NULL)")
+
+    def connection(self):
+        # sqlite3 connections may not be shared between threads, each thread gets its own
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # Imported on first use so the folder backend never loads sqlite3
+            import sqlite3
+            connection = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            self.local.connection = connection
+            self.local.depth = 0
+        return connection
+
+    def metadata_path(self, file_name):
+        return os.path.join(f"{os.path.splitext(self.db_path)[0]}.inotes", file_name)
+
+    def cached_notes(self):
+        return self.list_notes()
+
+    def list_notes(self):
+        rows = self.connection().execute("SELECT name, mtime, size FROM notes")
+        return {name: (mtime, size) for name, mtime, size in rows}
+
+    def revalidate(self, name):
+        row = self.connection().execute("SELECT mtime, size FROM notes WHERE name = ?", (name,)).fetchone()
+        return tuple(row) if row else None
+
+    def exists(self, name):
+        return self.connection().execute("SELECT 1 FROM notes WHERE name = ?", (name,)).fetchone() is not None
+
+    def open_text(self, name):
+        connection = self.connection()
+        row = connection.execute("SELECT rowid FROM notes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(name)
+        file = metrics.reader(BlobReader(connection.blobopen("notes", "content", row[0], readonly=True)))
+        if is_compressed(file):
+            return open_blocks(file)
+        return io.TextIOWrapper(io.BufferedReader(file), encoding="utf-8", errors="replace")
+
+    def write(self, name, content):
+        data = content.encode("utf-8")
+        size = len(data)
+        if self.compress_threshold is not None and size >= self.compress_threshold:
+            data = compress_blocks(data)
+        mtime = time.time()
+        with self.transaction():
+            self.connection().execute(
+                "INSERT INTO notes (name, mtime, size, content) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET mtime = excluded.mtime, size = excluded.size, content = excluded.content",
+                (name, mtime, size, data))
+        return mtime, size
+
+    def rename(self, old_name, new_name):
+        with self.transaction():
+            connection = self.connection()
+            if not self.exists(old_name):
+                raise FileNotFoundError(old_name)
+            if self.exists(new_name):
+                raise FileExistsError(new_name)
+            connection.execute("UPDATE notes SET name = ? WHERE name = ?", (new_name, old_name))
+
+    def delete(self, name):
+        with self.transaction():
+            if self.connection().execute("DELETE FROM notes WHERE name = ?", (name,)).rowcount == 0:
+                raise FileNotFoundError(name)
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection()
+        if self.local.depth == 0:
+            connection.execute("BEGIN IMMEDIATE")
+        self.local.depth += 1
+        try:
+            yield
+        except BaseException:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                connection.execute("ROLLBACK")
+            raise
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            connection.execute("COMMIT")
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+def open_storage(location, compress_threshold=None):
+    if location.endswith(".db"):
+        return PackedStorage(location, compress_threshold)
+    return FolderStorage(location, compress_threshold)
@@ -0,0 +1,96 @@
+import re
+
+CHUNK_SIZE = 1 << 20
+
+# Run of word characters at the start of a reversed chunk, i.e. the word the chunk ends in
+TRAILING_WORD = re.compile(r"\w*")
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    # Yields (offset, text) pieces of a text file, each cut after its last non-word
+    # character so no word is ever split between two pieces. Only a single word longer
+    # than chunk_size is cut, holding an unbroken multi-megabyte token is not worth it.
+    carry = ""
+    base = 0
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            if carry:
+                yield base, carry
+            return
+        # The carry is the start of one unfinished word, only the new text can hold the cut
+        tail = TRAILING_WORD.match(chunk[::-1]).end()
+        if tail == len(chunk):
+            if len(carry) < chunk_size:
+                carry += chunk
+                continue
+            tail = 0
+        text = carry + chunk[:len(chunk) - tail]
+        yield base, text
+        carry = chunk[len(chunk) - tail:]
+        base += len(text)
+
+def stream_matches(file, pattern, limit=None, overlap=256, width=30, chunk_size=CHUNK_SIZE):
+    # Runs a compiled pattern over a text file chunk by chunk. The last `overlap` characters of a
+    # chunk are searched again with the next one, and so is a match that reaches into them, so matches
+    # up to a chunk long are never cut short or reported twice.
+    # Yields (offset, matched text, snippet) and stops after `limit` matches.
+    found = 0
+    carry = ""
+    base = 0
+    # Where the next search starts, just past the last reported match
+    resume = 0
+    last_start = -1
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = carry + chunk
+        if not buffer:
+            return
+        final = not chunk
+        safe_end = max(resume, len(buffer) - overlap)
+        next_start = safe_end
+        for match in pattern.finditer(buffer, resume):
+            start = match.start()
+            if start >= safe_end and not final:
+                break
+            if start == last_start:
+                # An empty match already reported with the previous chunk
+                continue
+            if not final and match.end() > len(buffer) - overlap and len(buffer) - start <= chunk_size + overlap:
+                # Close enough to the end that it may go on in the next chunk; longer ones are reported as they are
+                next_start = start
+                break
+            snippet_start = max(0, start - width)
+            snippet = " ".join(buffer[snippet_start:match.end() + width].split())
+            prefix = "..." if base + snippet_start > 0 else ""
+            yield base + start, match.group(), f"{prefix}{snippet}..."
+            found += 1
+            if limit is not None and found >= limit:
+                return
+            last_start = start
+            resume = match.end()
+        if final:
+            return
+        next_start = max(next_start, resume)
+        # Keep some text before the cut for the next snippets, it is skipped when matching
+        keep_from = max(0, next_start - width)
+        carry = buffer[keep_from:]
+        base += keep_from
+        resume = next_start - keep_from
+        last_start -= keep_from
+
+def read_snippet(file, offset, length, width=30, chunk_size=CHUNK_SIZE):
+    window = ""
+    window_base = 0
+    stop = offset + length + width
+    for base, text in read_chunks(file, chunk_size):
+        if base + len(text) <= offset - width:
+            continue
+        if not window:
+            window_base = base
+        window += text
+        if base + len(text) >= stop:
+            break
+    start = max(0, offset - width - window_base)
+    snippet = " ".join(window[start:stop - window_base].split())
+    prefix = "..." if window_base + start > 0 else ""
+    return f"{prefix}{snippet}..."
@@ -0,0 +1,199 @@
+import os
+import select
+import struct
+import threading
+
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+# Events that mean the watch itself is gone or lost events, only a full rescan can recover
+RESCAN_MASK = IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+class FolderWatcher:
+    # Collects the names of changed files in one folder on a background thread. The owner drains
+    # them with take_changes() at its own pace, so a burst of events becomes one batch.
+    def __init__(self, folder, suffixes):
+        self.folder = folder
+        self.suffixes = suffixes
+        self.lock = threading.Lock()
+        self.changed = set()
+        self.rescan = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="inotes-watch", daemon=True)
+        self.thread.start()
+        return self
+
+    def is_note_file(self, file_name):
+        return file_name.endswith(self.suffixes)
+
+    def note_changed(self, file_name):
+        if self.is_note_file(file_name):
+            with self.lock:
+                self.changed.add(file_name)
+
+    def request_rescan(self):
+        with self.lock:
+            self.rescan = True
+
+    def take_changes(self):
+        # (changed file names, whether to rescan everything) or None when nothing happened
+        with self.lock:
+            if not self.changed and not self.rescan:
+                return None
+            changes = (self.changed, self.rescan)
+            self.changed = set()
+            self.rescan = False
+            return changes
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+class InotifyWatcher(FolderWatcher):
+    # Linux only, the kernel tells us about every change without any polling
+    def __init__(self, folder, suffixes):
+        super().__init__(folder, suffixes)
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), folder)
+        # stop() writes to this pipe to wake the reader thread
+        self.wake_read, self.wake_write = os.pipe()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                ready, _, _ = select.select([self.fd, self.wake_read], [], [])
+                if self.fd not in ready:
+                    continue
+                try:
+                    data = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self.parse_events(data)
+        finally:
+            os.close(self.fd)
+            os.close(self.wake_read)
+            os.close(self.wake_write)
+
+    def parse_events(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & RESCAN_MASK:
+                self.request_rescan()
+            elif name:
+                self.note_changed(os.fsdecode(name))
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            os.write(self.wake_write, b"\0")
+        super().stop()
+
+class PollingWatcher(FolderWatcher):
+    # Fallback for systems without inotify. A stat of the folder catches added, removed and
+    # renamed notes; edits in place keep the folder mtime, so a slice of the notes is also
+    # stat'ed on every tick and the whole folder is covered over time without bursts of I/O.
+    def __init__(self, folder, suffixes, interval=1.0, notes_per_tick=200):
+        super().__init__(folder, suffixes)
+        self.interval = interval
+        self.notes_per_tick = notes_per_tick
+        self.dir_mtime = None
+        # file name -> (mtime, size)
+        self.known = {}
+        self.next_slice = 0
+
+    def folder_mtime(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def list_folder(self):
+        files = {}
+        try:
+            with os.scandir(self.folder) as iterator:
+                for entry in iterator:
+                    if not self.is_note_file(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return files
+
+    def run(self):
+        self.dir_mtime = self.folder_mtime()
+        self.known = self.list_folder()
+        while not self.stopped.wait(self.interval):
+            dir_mtime = self.folder_mtime()
+            if dir_mtime != self.dir_mtime:
+                self.dir_mtime = dir_mtime
+                files = self.list_folder()
+                for file_name in self.known.keys() | files.keys():
+                    if self.known.get(file_name) != files.get(file_name):
+                        self.note_changed(file_name)
+                self.known = files
+            else:
+                self.check_slice()
+
+    def check_slice(self):
+        names = list(self.known)
+        if not names:
+            return
+        start = self.next_slice % len(names)
+        self.next_slice = start + self.notes_per_tick
+        for file_name in names[start:start + self.notes_per_tick]:
+            try:
+                stat = os.stat(os.path.join(self.folder, file_name))
+                entry = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                entry = None
+            if entry != self.known[file_name]:
+                if entry is None:
+                    del self.known[file_name]
+                else:
+                    self.known[file_name] = entry
+                self.note_changed(file_name)
+
+def watch_folder(folder, suffixes, use_inotify=True):
+    # inotify where the platform has it, polling everywhere else
+    if use_inotify and hasattr(select, "select") and os.name == "posix":
+        try:
+            return InotifyWatcher(folder, suffixes).start()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder, suffixes).start()
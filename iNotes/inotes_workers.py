@@ -0,0 +1,122 @@
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+class CancelToken:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class BackgroundWorker:
+    # Jobs run on a thread pool and report back through a queue that the Tk loop drains with after()
+    POLL_INTERVAL = 30
+    MAX_MESSAGES_PER_POLL = 200
+
+    def __init__(self, root, max_workers=4, use_processes=False):
+        self.root = root
+        self.threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inotes-worker")
+        self.use_processes = use_processes
+        self.processes = None
+        self.messages = queue.Queue()
+        self.tokens = {}
+        self.running = 0
+        self.polling = False
+
+    def process_pool(self):
+        # CPU-bound matching can be spread over processes, only created when asked for
+        if not self.use_processes:
+            return None
+        if self.processes is None:
+            # Imported here, multiprocessing is not needed unless processes are used
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.processes = ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=multiprocessing.get_context("spawn"))
+        return self.processes
+
+    def submit(self, channel, job, on_batch=None, on_progress=None, on_done=None):
+        # A new job on a channel cancels whatever was still running there
+        self.cancel(channel)
+        token = CancelToken()
+        self.tokens[channel] = token
+
+        def emit(batch):
+            if not token.cancelled:
+                self.messages.put((token, on_batch, (batch,)))
+
+        def progress(done, total):
+            if not token.cancelled:
+                self.messages.put((token, on_progress, (done, total)))
+
+        def run():
+            try:
+                result = job(token, emit, progress)
+            except Exception:
+                self.messages.put((token, self.report_error, sys.exc_info()))
+            else:
+                self.messages.put((token, on_done, (result,)))
+            finally:
+                self.messages.put((None, self.job_finished, (channel, token)))
+
+        self.running += 1
+        self.threads.submit(run)
+        self.start_polling()
+        return token
+
+    def hold(self):
+        # Keeps the queue polled while work submitted elsewhere (e.g. the note saver) is pending
+        self.running += 1
+        self.start_polling()
+
+    def release(self):
+        self.running -= 1
+
+    def post(self, callback, *args):
+        # Safe to call from any thread, the callback runs on the Tk thread
+        self.messages.put((None, callback, args))
+
+    def cancel(self, channel):
+        token = self.tokens.pop(channel, None)
+        if token is not None:
+            token.cancel()
+
+    def is_busy(self, channel):
+        return channel in self.tokens
+
+    def start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        for _ in range(self.MAX_MESSAGES_PER_POLL):
+            try:
+                token, callback, args = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if token is not None and token.cancelled:
+                continue
+            if callback is not None:
+                callback(*args)
+
+        if self.running or not self.messages.empty():
+            self.root.after(self.POLL_INTERVAL, self.poll)
+        else:
+            self.polling = False
+
+    def job_finished(self, channel, token):
+        self.running -= 1
+        if self.tokens.get(channel) is token:
+            del self.tokens[channel]
+
+    def report_error(self, error_type, error, traceback):
+        self.root.report_callback_exception(error_type, error, traceback)
+
+    def shutdown(self):
+        for channel in list(self.tokens):
+            self.cancel(channel)
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.shutdown(wait=False, cancel_futures=True)